@@ -0,0 +1,249 @@
+# Copyright 2021 TWO SIGMA OPEN SOURCE, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import functools
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+MEMORY_BUDGET = 2 * 1024 ** 3
+SESSION_BUDGET = 1024 ** 3
+SPILL_THRESHOLD = 64 * 1024 ** 2
+SESSION_TTL = 0
+
+
+def synchronized(f):
+    @functools.wraps(f)
+    def wrap(self, *args, **kwargs):
+        with self.lock:
+            return f(self, *args, **kwargs)
+
+    return wrap
+
+
+def env_int(name, default):
+    value = os.environ.get(name)
+    return default if value is None or value == '' else int(value)
+
+
+class StoredValue:
+
+    def __init__(self, value, version):
+        self.value = value
+        self.version = version
+        self.binary = isinstance(value, bytes)
+        self.size = StoredValue.byte_size(value)
+        self.path = None
+
+    @staticmethod
+    def byte_size(value):
+        if isinstance(value, bytes) or value.isascii():
+            return len(value)
+        return len(value.encode('utf-8'))
+
+    def write(self, directory):
+        value = self.value
+        if value is None:
+            return None
+        fd, path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(value if self.binary else value.encode('utf-8'))
+        return path
+
+    def spill(self, directory):
+        self.path = self.write(directory)
+        self.value = None
+
+    def open(self):
+        if self.path is None:
+            return self.value
+        with open(self.path, 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def discard(self):
+        if self.path is not None:
+            os.remove(self.path)
+            self.path = None
+        self.value = None
+
+
+class AutotranslationStore:
+
+    def __init__(self, memory_budget=None, session_budget=None, spill_threshold=None, session_ttl=None):
+        self.memory_budget = env_int("BEAKERX_AUTOTRANSLATION_MEMORY_BUDGET", MEMORY_BUDGET) \
+            if memory_budget is None else memory_budget
+        self.session_budget = env_int("BEAKERX_AUTOTRANSLATION_SESSION_BUDGET", SESSION_BUDGET) \
+            if session_budget is None else session_budget
+        self.spill_threshold = env_int("BEAKERX_AUTOTRANSLATION_SPILL_THRESHOLD", SPILL_THRESHOLD) \
+            if spill_threshold is None else spill_threshold
+        self.session_ttl = env_int("BEAKERX_AUTOTRANSLATION_SESSION_TTL", SESSION_TTL) \
+            if session_ttl is None else session_ttl
+        self.sessions = {}
+        self.session_sizes = {}
+        self.accessed = {}
+        self.memory = OrderedDict()
+        self.memory_size = 0
+        self.version = 0
+        self.id = uuid.uuid4().hex
+        self.spill_dir = None
+        self.lock = threading.RLock()
+
+    def set(self, session_id, name, value):
+        stored = StoredValue(value, 0)
+        if self.spill_threshold > 0 and stored.size >= self.spill_threshold:
+            stored.spill(self.get_spill_dir())
+        self.add(session_id, name, stored)
+        self.limit_memory()
+
+    def set_file(self, session_id, name, path, binary):
+        stored = StoredValue(b'' if binary else '', 0)
+        stored.size = os.path.getsize(path)
+        stored.value = None
+        stored.path = path
+        self.add(session_id, name, stored)
+
+    @synchronized
+    def add(self, session_id, name, stored):
+        if session_id not in self.sessions:
+            self.sessions[session_id] = OrderedDict()
+            self.session_sizes[session_id] = 0
+        self.remove(session_id, name)
+        self.version += 1
+        stored.version = self.version
+        self.sessions[session_id][name] = stored
+        self.session_sizes[session_id] += stored.size
+        self.accessed[session_id] = time.time()
+        self.evict_session(session_id)
+        if stored.path is None:
+            self.memory[(session_id, name)] = stored
+            self.memory_size += stored.size
+
+    def get(self, session_id, name):
+        opened = self.open(session_id, name)
+        if opened is None:
+            return None
+        etag, binary, data = opened
+        if not isinstance(data, mmap.mmap):
+            return data
+        with data:
+            return data[:] if binary else data[:].decode('utf-8')
+
+    @synchronized
+    def entry(self, session_id, name):
+        values = self.sessions.get(session_id)
+        if values is None or name not in values:
+            return None
+        values.move_to_end(name)
+        if (session_id, name) in self.memory:
+            self.memory.move_to_end((session_id, name))
+        self.accessed[session_id] = time.time()
+        return values[name]
+
+    @synchronized
+    def etag(self, session_id, name):
+        stored = self.sessions.get(session_id, {}).get(name)
+        return None if stored is None else '"{0}-{1}"'.format(self.id, stored.version)
+
+    @synchronized
+    def open(self, session_id, name):
+        stored = self.entry(session_id, name)
+        if stored is None:
+            return None
+        return self.etag(session_id, name), stored.binary, stored.open()
+
+    @synchronized
+    def names(self, session_id):
+        values = self.sessions.get(session_id, {})
+        return [{'name': name,
+                 'size': stored.size,
+                 'version': stored.version,
+                 'format': 'arrow' if stored.binary else 'json'} for name, stored in values.items()]
+
+    @synchronized
+    def remove(self, session_id, name):
+        stored = self.sessions.get(session_id, {}).pop(name, None)
+        if stored is None:
+            return
+        self.session_sizes[session_id] -= stored.size
+        if self.memory.pop((session_id, name), None) is not None:
+            self.memory_size -= stored.size
+        stored.discard()
+
+    @synchronized
+    def remove_session(self, session_id):
+        for name in list(self.sessions.get(session_id, {})):
+            self.remove(session_id, name)
+        self.sessions.pop(session_id, None)
+        self.session_sizes.pop(session_id, None)
+        self.accessed.pop(session_id, None)
+
+    def evict_session(self, session_id):
+        values = self.sessions[session_id]
+        while self.session_sizes[session_id] > self.session_budget and len(values) > 1:
+            self.remove(session_id, next(iter(values)))
+
+    def limit_memory(self):
+        # spill outside the lock so other requests are not blocked on disk writes
+        for session_id, name, stored in self.over_memory_budget():
+            path = None
+            if self.spill_threshold > 0 and stored.size > 0:
+                path = stored.write(self.get_spill_dir())
+            self.spilled(session_id, name, stored, path)
+
+    @synchronized
+    def over_memory_budget(self):
+        values = []
+        while self.memory_size > self.memory_budget and len(self.memory) > 0:
+            (session_id, name), stored = self.memory.popitem(last=False)
+            self.memory_size -= stored.size
+            values.append((session_id, name, stored))
+        return values
+
+    @synchronized
+    def spilled(self, session_id, name, stored, path):
+        if self.sessions.get(session_id, {}).get(name) is not stored:
+            if path is not None:
+                os.remove(path)
+        elif path is None:
+            self.remove(session_id, name)
+        else:
+            stored.path = path
+            stored.value = None
+
+    @synchronized
+    def expire(self, now=None):
+        if self.session_ttl <= 0:
+            return
+        deadline = (time.time() if now is None else now) - self.session_ttl
+        for session_id in [s for s, accessed in self.accessed.items() if accessed < deadline]:
+            self.remove_session(session_id)
+
+    @synchronized
+    def get_spill_dir(self):
+        if self.spill_dir is None:
+            self.spill_dir = tempfile.mkdtemp(prefix='beakerx-autotranslation-')
+        return self.spill_dir
+
+    @synchronized
+    def close(self):
+        for session_id in list(self.sessions):
+            self.remove_session(session_id)
+        if self.spill_dir is not None:
+            shutil.rmtree(self.spill_dir, ignore_errors=True)
+            self.spill_dir = None
@@ -12,17 +12,31 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import atexit
 import base64
+import inspect
+import json
 import logging
+import mmap
 import os
 import random
 import socket
 import string
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 
 import tornado.ioloop
 import tornado.web
 
-beakerx = {}
+from .autotranslation_store import AutotranslationStore
+
+ARROW_CONTENT_TYPE = 'application/vnd.apache.arrow.stream'
+
+
+CHUNK_SIZE = 1024 ** 2
+
+beakerx = AutotranslationStore()
+executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='beakerx-autotranslation')
 
 logging.getLogger('tornado.access').disabled = True
 
@@ -37,9 +51,9 @@ def basic_auth(f):
 
     def _request_error(handler, exception):
         handler.set_status(500)
-        return handler.finish(exception)
+        return handler.finish(str(exception))
 
-    def wrap(*args):
+    async def wrap(*args):
         handler = args[0]
         try:
             auth_header = handler.request.headers.get('Authorization')
@@ -48,7 +62,9 @@ def basic_auth(f):
             auth_decoded = base64.b64decode(auth_header[6:])
             username, password = auth_decoded.decode('UTF-8').split(':', 2)
             if auth(username, password):
-                f(*args)
+                result = f(*args)
+                if inspect.isawaitable(result):
+                    await result
             else:
                 _request_auth(handler)
         except Exception as e:
@@ -57,42 +73,189 @@ def basic_auth(f):
     return wrap
 
 
+def run_in_executor(f, *args):
+    return tornado.ioloop.IOLoop.current().run_in_executor(executor, f, *args)
+
+
 class MainSaveHandler(tornado.web.RequestHandler):
 
     @basic_auth
-    def post(self):
-        input_json = tornado.escape.json_decode(self.request.body)
-        self.validate_autotraslation_input(input_json, "sessionId")
-        self.validate_autotraslation_input(input_json, "name")
-        self.validate_autotraslation_input(input_json, "json")
-
-        session_id = input_json["sessionId"]
-        name = input_json["name"]
-        json = input_json["json"]
-        if session_id not in beakerx:
-            beakerx[session_id] = {}
-
-        beakerx[session_id][name] = json
+    async def post(self):
+        await run_in_executor(MainSaveHandler.save, self.request.body)
         return self.finish("ok")
 
+    @staticmethod
+    def save(body):
+        input_json = tornado.escape.json_decode(body)
+        MainSaveHandler.validate_autotraslation_input(input_json, "sessionId")
+        MainSaveHandler.validate_autotraslation_input(input_json, "name")
+        MainSaveHandler.validate_autotraslation_input(input_json, "json")
+
+        beakerx.set(input_json["sessionId"], input_json["name"], input_json["json"])
+
     @staticmethod
     def validate_autotraslation_input(input_json, key):
         if key not in input_json:
             raise Exception("Data doesn't contain attribute: " + key)
 
 
-class MainGetHandler(tornado.web.RequestHandler):
+@tornado.web.stream_request_body
+class VariableHandler(tornado.web.RequestHandler):
+
+    def initialize(self):
+        self.chunks = []
+        self.size = 0
+        self.file = None
+        self.path = None
 
     @basic_auth
-    def get(self, session_id, name):
-        if session_id in beakerx and name in beakerx[session_id]:
-            return self.finish(beakerx[session_id][name])
-        return self.finish("undefined")
+    def prepare(self):
+        if self.request.method == 'POST':
+            self.request.connection.set_max_body_size(beakerx.session_budget)
+
+    async def data_received(self, chunk):
+        self.size += len(chunk)
+        if self.file is None and 0 < beakerx.spill_threshold <= self.size:
+            fd, self.path = tempfile.mkstemp(dir=beakerx.get_spill_dir())
+            self.file = os.fdopen(fd, 'wb')
+            await run_in_executor(self.file.writelines, self.chunks)
+            self.chunks = []
+        if self.file is None:
+            self.chunks.append(chunk)
+        else:
+            await run_in_executor(self.file.write, chunk)
+
+    @basic_auth
+    async def get(self, session_id, name):
+        opened = await run_in_executor(beakerx.open, session_id, name)
+        if opened is None:
+            return self.finish("undefined")
+        etag, binary, data = opened
+        try:
+            self.set_header('Etag', etag)
+            if self.check_etag_header():
+                self.set_status(304)
+                return self.finish()
+            if binary and not accepts_arrow(self):
+                return self.finish(await run_in_executor(arrow_to_json, data))
+            if binary:
+                self.set_header('Content-Type', ARROW_CONTENT_TYPE)
+            if not isinstance(data, mmap.mmap):
+                return self.finish(data)
+            for start in range(0, len(data), CHUNK_SIZE):
+                self.write(await run_in_executor(data.__getitem__, slice(start, start + CHUNK_SIZE)))
+                await self.flush()
+            return self.finish()
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+
+    @basic_auth
+    async def post(self, session_id, name):
+        content_type = self.request.headers.get('Content-Type', '')
+        if not content_type.startswith((ARROW_CONTENT_TYPE, 'application/json')):
+            raise Exception("Unsupported content type: " + content_type)
+        binary = content_type.startswith(ARROW_CONTENT_TYPE)
+        if self.file is not None:
+            await run_in_executor(self.file.close)
+            await run_in_executor(beakerx.set_file, session_id, name, self.path, binary)
+            self.path = None
+        else:
+            await run_in_executor(VariableHandler.save, session_id, name, self.chunks, binary)
+        return self.finish("ok")
+
+    @staticmethod
+    def save(session_id, name, chunks, binary):
+        value = b''.join(chunks)
+        beakerx.set(session_id, name, value if binary else value.decode('utf-8'))
+
+    def on_finish(self):
+        if self.file is not None:
+            self.file.close()
+        if self.path is not None:
+            os.remove(self.path)
+
+
+class BatchHandler(tornado.web.RequestHandler):
+
+    @basic_auth
+    async def get(self):
+        session_id = self.get_query_argument("sessionId")
+        names = self.get_query_arguments("name")
+        known = dict(k.rsplit(':', 1) for k in self.get_query_arguments("known"))
+        return self.finish(await run_in_executor(BatchHandler.load, session_id, names, known, accepts_arrow(self)))
+
+    @staticmethod
+    def load(session_id, names, known, arrow_accepted):
+        values = {}
+        etags = {}
+        arrow = []
+        unchanged = []
+        for name in names:
+            opened = beakerx.open(session_id, name)
+            if opened is None:
+                values[name] = "undefined"
+                continue
+            etag, binary, data = opened
+            etags[name] = etag
+            if known.get(name) == etag:
+                unchanged.append(name)
+            elif binary and arrow_accepted:
+                arrow.append(name)
+            else:
+                values[name] = arrow_to_json(data) if binary else read_value(data)
+            if isinstance(data, mmap.mmap):
+                data.close()
+        return {"values": values, "etags": etags, "arrow": arrow, "unchanged": unchanged}
+
+    @basic_auth
+    async def post(self):
+        await run_in_executor(BatchHandler.save, self.request.body)
+        return self.finish("ok")
+
+    @staticmethod
+    def save(body):
+        input_json = tornado.escape.json_decode(body)
+        MainSaveHandler.validate_autotraslation_input(input_json, "sessionId")
+        MainSaveHandler.validate_autotraslation_input(input_json, "values")
+        for name, value in input_json["values"].items():
+            beakerx.set(input_json["sessionId"], name, value)
+
+
+class SessionHandler(tornado.web.RequestHandler):
+
+    @basic_auth
+    async def get(self, session_id):
+        return self.finish({"names": await run_in_executor(beakerx.names, session_id)})
+
+    @basic_auth
+    async def delete(self, session_id):
+        await run_in_executor(beakerx.remove_session, session_id)
+        return self.finish("ok")
+
+
+def accepts_arrow(handler):
+    return ARROW_CONTENT_TYPE in handler.request.headers.get('Accept', '')
+
+
+def read_value(data):
+    if not isinstance(data, mmap.mmap):
+        return data
+    with data:
+        return data[:].decode('utf-8')
+
+
+def arrow_to_json(value):
+    from .runtime import DataFrameEncoder, transformBackArrow
+    # copy spilled values so no arrow buffer still references the mmap when it is closed
+    return json.dumps(transformBackArrow(value[:] if isinstance(value, mmap.mmap) else value), cls=DataFrameEncoder)
 
 
 def make_app():
     return tornado.web.Application([
-        (r"/autotranslation/(.*)/(.*)", MainGetHandler),
+        (r"/autotranslation/batch", BatchHandler),
+        (r"/autotranslation/([^/]+)/", SessionHandler),
+        (r"/autotranslation/(.*)/(.*)", VariableHandler),
         (r"/autotranslation/", MainSaveHandler),
     ])
 
@@ -120,3 +283,6 @@ def start_autotranslation_server():
     init_env()
     app = make_app()
     app.listen(os.environ["BEAKERX_AUTOTRANSLATION_PORT"])
+    if beakerx.session_ttl > 0:
+        tornado.ioloop.PeriodicCallback(lambda: run_in_executor(beakerx.expire), 60 * 60 * 1000).start()
+    atexit.register(lambda: beakerx.close())
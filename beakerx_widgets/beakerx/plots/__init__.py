@@ -16,3 +16,4 @@ from .chart import *
 from .legend import *
 from .plotitem import *
 from .plotitem_treemap import *
+from .lod_reducer import LodType
@@ -13,8 +13,11 @@
 # limitations under the License.
 
 import json
+import threading
+import time
 from enum import Enum
 
+import numpy as np
 from beakerx_base import getValue, Color, date_time_2_millis, BeakerxDOMWidget
 from ipykernel.comm import Comm
 from pandas import DataFrame, RangeIndex
@@ -22,7 +25,98 @@ from traitlets import Dict, Unicode
 
 from .chart_models import XYChart, CategoryChart, HeatMapChart, HistogramChart, TreeMapChart, CombinedChart, \
     LegendLayout, LegendPosition
-from .plotitem import GradientColor, Points, Line
+from .plotitem import GradientColor, Points, Line, XYGraphics, _column_to_list
+
+_BINARY_COLUMNS = ('x', 'y', 'bases', 'sizes', 'widths')
+_MAX_SAFE_INTEGER = 2 ** 53
+_NAN_MARKERS = ('NaN', 'Infinity', '-Infinity')
+
+
+def _to_binary_column(values):
+    if not isinstance(values, (list, np.ndarray)) or len(values) == 0:
+        return None
+    kind = 'Number'
+    first = values[0]
+    if isinstance(first, dict) and first.get('type') == 'Date':
+        kind = 'Date'
+        values = [v['timestamp'] if isinstance(v, dict) else np.nan for v in values]
+    column = np.asarray(values)
+    if column.dtype.kind in 'iub':
+        if column.dtype.kind != 'b' and np.abs(column).max() > _MAX_SAFE_INTEGER:
+            return None
+    elif column.dtype.kind != 'f':
+        if any(isinstance(v, str) and v not in _NAN_MARKERS for v in values):
+            return None
+        try:
+            column = np.asarray(values, dtype=np.float64)
+        except (ValueError, TypeError):
+            return None
+    if column.ndim != 1:
+        return None
+    column = np.ascontiguousarray(column, dtype='<f8')
+    return {'type': 'Buffer', 'dtype': 'float64', 'kind': kind, 'value': memoryview(column)}
+
+
+def _to_binary_model(model):
+    binary_model = dict(model)
+    if isinstance(model.get('graphics_list'), list):
+        binary_model['graphics_list'] = [_to_binary_graphics(g) for g in model['graphics_list']]
+    if isinstance(model.get('plots'), list):
+        binary_model['plots'] = [_to_binary_model(p) for p in model['plots']]
+    return binary_model
+
+
+def _to_binary_graphics(graphics):
+    if not isinstance(graphics, dict):
+        return graphics
+    binary_graphics = dict(graphics)
+    for key in _BINARY_COLUMNS:
+        column = _to_binary_column(graphics.get(key))
+        if column is not None:
+            binary_graphics[key] = column
+    return binary_graphics
+
+
+def _to_binary_patch(patch, buffers):
+    binary_patch = dict(patch)
+    binary_patch['items'] = {uid: _to_binary_graphics(changes) for uid, changes in patch['items'].items()}
+    binary_patch['added'] = [_to_binary_graphics(item) for item in patch['added']]
+    binary_patch['appended'] = {uid: _to_binary_graphics(tail) for uid, tail in patch['appended'].items()}
+    binary_columns = list(binary_patch['items'].values()) + binary_patch['added'] + list(
+        binary_patch['appended'].values())
+    for graphics in binary_columns:
+        for column in graphics.values():
+            if isinstance(column, dict) and column.get('type') == 'Buffer':
+                buffers.append(column['value'])
+                column['value'] = len(buffers) - 1
+    return binary_patch
+
+
+def _merge_changes(target, changes):
+    for key, value in changes.items():
+        if value is None:
+            target.pop(key, None)
+        else:
+            target[key] = value
+
+
+def _apply_patch(model, patch):
+    _merge_changes(model, patch['model'])
+    graphics_models = {g['uid']: g for g in model['graphics_list']}
+    for uid, changes in patch['items'].items():
+        _merge_changes(graphics_models[uid], changes)
+    for uid, tail in patch['appended'].items():
+        for key, values in tail.items():
+            graphics_models[uid][key].extend(values)
+            if patch['window'] is not None:
+                del graphics_models[uid][key][:-patch['window']]
+    model['graphics_list'].extend(patch['added'])
+
+
+def _model_to_json(model, widget):
+    if getattr(widget, 'binary_transport', False):
+        return _to_binary_model(model)
+    return model
 
 
 class Plot(BeakerxDOMWidget):
@@ -30,10 +124,17 @@ class Plot(BeakerxDOMWidget):
     _model_name = Unicode('PlotModel').tag(sync=True)
     _view_module = Unicode('beakerx').tag(sync=True)
     _model_module = Unicode('beakerx').tag(sync=True)
-    model = Dict().tag(sync=True)
+    model = Dict().tag(sync=True, to_json=_model_to_json)
 
     def __init__(self, **kwargs):
         super(Plot, self).__init__()
+        self.binary_transport = getValue(kwargs, 'binaryTransport', False)
+        self.streaming = False
+        self.stream_window = None
+        self.stream_interval = 0.05
+        self._model_lock = threading.RLock()
+        self._flush_timer = None
+        self._last_flush = 0
         self.chart = XYChart(**kwargs)
         self.model = self.chart.transform()
         self.on_msg(self._handle_msg)
@@ -41,20 +142,52 @@ class Plot(BeakerxDOMWidget):
 
     def add(self, item):
         self.chart.add(item)
-        self.model = self.chart.transform()
+        if self.streaming:
+            self._listen_to_appends()
+        self._update_model()
+        return self
+
+    def stream(self, window=None, interval=0.05):
+        self.streaming = True
+        self.stream_window = window
+        self.stream_interval = interval
+        self._listen_to_appends()
         return self
 
+    def _listen_to_appends(self):
+        for item in self.chart.graphics_list:
+            if isinstance(item, XYGraphics) and item.onAppendListener != self._on_append:
+                item.onAppendListener = self._on_append
+
+    def _on_append(self, item):
+        with self._model_lock:
+            if self._flush_timer is not None:
+                return
+            delay = self._last_flush + self.stream_interval - time.monotonic()
+            if delay > 0:
+                self._flush_timer = threading.Timer(delay, self._flush_appends)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+                return
+        self._flush_appends()
+
+    def _flush_appends(self):
+        with self._model_lock:
+            self._flush_timer = None
+            self._last_flush = time.monotonic()
+            self._update_model()
+
     def getYAxes(self):
         return self.chart.rangeAxes
 
     def setShowLegend(self, show):
         self.chart.show_legend = show
-        self.model = self.chart.transform()
+        self._update_model()
         return self
 
     def setLegendPosition(self, position):
         self.chart.legend_position = position
-        self.model = self.chart.transform()
+        self._update_model()
         return self
 
     def setXBound(self, *args):
@@ -66,7 +199,7 @@ class Plot(BeakerxDOMWidget):
                 raise ValueError('to set the x bound, the list needs to be of size=2.')
         else:
             self.chart.setXBound(args[0], args[1])
-        self.model = self.chart.transform()
+        self._update_model()
         return self
 
     def setYBound(self, *args):
@@ -78,54 +211,79 @@ class Plot(BeakerxDOMWidget):
                 raise ValueError('to set the y bound, the list needs to be of size=2.')
         else:
             self.chart.setYBound(args[0], args[1])
-        self.model = self.chart.transform()
+        self._update_model()
         return self
 
     def _repr_mimebundle_(self, **kwargs):
-        self.model = self.chart.transform()
+        with self._model_lock:
+            self.model = self.chart.transform()
         return super(Plot, self)._repr_mimebundle_(**kwargs)
 
+    def _update_model(self, refresh=()):
+        with self._model_lock:
+            patch = self.chart.transform_patch(self.model, self.stream_window, refresh)
+            if patch is None:
+                self.model = self.chart.transform()
+                return
+            if not (patch['model'] or patch['items'] or patch['added'] or patch['appended']):
+                return
+            _apply_patch(self.model, patch)
+            buffers = []
+            if self.binary_transport:
+                patch = _to_binary_patch(patch, buffers)
+            self.send({'event': 'modelPatch', 'patch': patch}, buffers)
+
     def _handle_msg(self, msg):
         if 'content' in msg['content']['data']:
             params = msg['content']['data']['content']
-            graphics_object = None
-            for item in self.chart.graphics_list:
-                if item.uid == params['itemId']:
-                    graphics_object = item
+            if params['event'] == 'onzoom':
+                self._on_zoom(params['params'])
+                return
+            graphics_object = self.chart.get_graphics(params['itemId'])
             self.details = GraphicsActionObject(graphics_object, params['params'])
             if params['event'] == 'onclick':
-                self._on_click_action(msg)
+                self._on_click_action(graphics_object)
             elif params['event'] == 'onkey':
-                self._on_key_action(msg)
+                self._on_key_action(graphics_object, params['params']['key'])
             elif params['event'] == 'actiondetails':
-                self._on_action_details(msg)
-
-    def _on_click_action(self, msg):
-        params = msg['content']['data']['content']
-        for item in self.chart.graphics_list:
-            if item.uid == params['itemId']:
-                item.fireClick(self.details)
-                self.model = self.chart.transform()
-
-    def _on_key_action(self, msg):
-        params = msg['content']['data']['content']
-        for item in self.chart.graphics_list:
-            if item.uid == params['itemId']:
-                item.fireKey(self.details, params['params']['key'])
-                self.model = self.chart.transform()
-
-    def _on_action_details(self, msg):
-        params = msg['content']['data']['content']
-        graphics_object = None
-        for item in self.chart.graphics_list:
-            if item.uid == params['itemId']:
-                graphics_object = item
-        action_type = params['params']['actionType']
+                self._on_action_details(graphics_object, params['params'])
+
+    def _on_click_action(self, item):
+        if item is not None:
+            item.fireClick(self.details)
+            # handlers may edit columns in place, which change tracking cannot see
+            self._update_model(refresh=(item.uid,))
+
+    def _on_key_action(self, item, key):
+        if item is not None:
+            item.fireKey(self.details, key)
+            self._update_model(refresh=(item.uid,))
+
+    def _on_zoom(self, params):
+        if self.chart.server_lod is None:
+            return
+        lower, upper, width = params.get('xl'), params.get('xr'), params.get('width')
+        if lower is not None and upper is not None:
+            # reduce one view width on each side so panning shows data until the next reply
+            span = upper - lower
+            lower, upper = lower - span, upper + span
+            width = None if width is None else width * 3
+        with self._model_lock:
+            self.chart.setLodRange(lower, upper, width)
+            patch = self.chart.transform_lod_patch(self.model)
+            _apply_patch(self.model, patch)
+            buffers = []
+            if self.binary_transport:
+                patch = _to_binary_patch(patch, buffers)
+            self.send({'event': 'modelPatch', 'patch': patch, 'keepFocus': True}, buffers)
+
+    def _on_action_details(self, item, params):
+        action_type = params['actionType']
         if action_type == 'onclick' or action_type == 'onkey':
-            self.details = GraphicsActionObject(graphics_object, params['params'])
+            self.details = GraphicsActionObject(item, params)
             arguments = dict(target_name='beakerx.tag.run')
             comm = Comm(**arguments)
-            msg = {'runByTag': params['params']['tag']}
+            msg = {'runByTag': params['tag']}
             state = {'state': msg}
             comm.send(data=state, buffers=[])
 
@@ -136,6 +294,8 @@ class GraphicsActionObject:
         self.key = params.get('key')
         self.tag = params.get('tag')
         self.index = params.get('index')
+        if isinstance(graphics_object, XYGraphics):
+            self.index = graphics_object.source_index(self.index)
         self.actionType = params.get('actionType')
 
 
@@ -173,7 +333,7 @@ class HeatMap(BeakerxDOMWidget):
         if 'data' in kwargs:
             data_from_kwargs = kwargs['data']
             if isinstance(data_from_kwargs, DataFrame):
-                kwargs['graphics'] = data_from_kwargs.values.tolist()
+                kwargs['graphics'] = data_from_kwargs.values
             else:
                 kwargs['graphics'] = data_from_kwargs
         if not 'xLowerMargin' in kwargs:
@@ -220,13 +380,24 @@ class Histogram(BeakerxDOMWidget):
         super(Histogram, self).__init__()
         self.chart = HistogramChart(**kwargs)
         data = getValue(kwargs, 'data', [])
-        if len(data) > 1 and isinstance(data[0], list):
+        if len(data) > 1 and isinstance(data[0], (list, np.ndarray)):
             for x in data:
                 self.chart.graphics_list.append(x)
         else:
             self.chart.graphics_list.append(data)
+        chunks = getValue(kwargs, 'chunks')
+        if chunks is not None:
+            # not displayed yet, so intermediate models would never be seen
+            for _ in self.chart.accumulate(chunks):
+                pass
         self.model = self.chart.transform()
 
+    def accumulate(self, chunks):
+        # refreshes after each chunk so an already displayed histogram shows progress
+        for _ in self.chart.accumulate(chunks):
+            self.model = self.chart.transform()
+        return self
+
 
 class TreeMap(BeakerxDOMWidget):
     _view_name = Unicode('PlotView').tag(sync=True)
@@ -274,18 +445,17 @@ class NanoPlot(TimePlot):
         self.chart.type = 'NanoPlot'
 
     def add(self, item):
-        super(NanoPlot, self).add(item)
-        for l in self.chart.graphics_list:
-            convertedx = []
-            convertedy = []
-            for x in l.x:
-                convertedx.append(str(x))
-            l.x = convertedx
-            for y in l.y:
-                convertedy.append(str(y))
-            l.y = convertedy
-        self.model = self.chart.transform()
-        return self
+        self._stringify(item)
+        return super(NanoPlot, self).add(item)
+
+    @staticmethod
+    def _stringify(item):
+        if isinstance(item, list):
+            for elem in item:
+                NanoPlot._stringify(elem)
+        elif isinstance(item, XYGraphics):
+            item.x = [str(x) for x in _column_to_list(item.x)]
+            item.y = [str(y) for y in _column_to_list(item.y)]
 
 
 class SimpleTimePlot(TimePlot):
@@ -377,10 +547,11 @@ class CombinedPlot(BeakerxDOMWidget):
     _model_name = Unicode('PlotModel').tag(sync=True)
     _view_module = Unicode('beakerx').tag(sync=True)
     _model_module = Unicode('beakerx').tag(sync=True)
-    model = Dict().tag(sync=True)
+    model = Dict().tag(sync=True, to_json=_model_to_json)
 
     def __init__(self, **kwargs):
         super(CombinedPlot, self).__init__()
+        self.binary_transport = getValue(kwargs, 'binaryTransport', False)
         self.chart = CombinedChart(**kwargs)
         self.model = self.chart.transform()
 
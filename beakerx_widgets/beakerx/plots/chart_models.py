@@ -13,11 +13,18 @@
 # limitations under the License.
 
 import copy
+import json
+
+import numpy as np
+import pandas as pd
 
 from beakerx_base import BaseObject, getValue, Color
 
+from .histogram_binner import HistogramBinner, HistogramAccumulator
 from .legend import LegendPosition, LegendLayout
-from .plotitem import YAxis, Text, ConstantLine, ConstantBand, Graphics
+from .plotitem import YAxis, Text, ConstantLine, ConstantBand, Graphics, XYGraphics, ColumnEncoder, \
+    AggregationType
+from .lod_reducer import LodReducer, LodType
 from .plotitem_treemap import RandomColorProvider, ValueAccessor, Mode
 from .tree_map_reducer import TreeMapReducer
 
@@ -37,7 +44,7 @@ class Chart(BaseObject):
     def transform(self):
         self_copy = copy.copy(self)
         self_copy.legend_position = {'type': 'LegendPosition', 'position': self_copy.legend_position}
-        return super(Chart, self_copy).transform()
+        return json.loads(json.dumps(self_copy, cls=ColumnEncoder))
 
 
 class AbstractChart(Chart):
@@ -82,6 +89,9 @@ class XYChart(AbstractChart):
         self.log_x = getValue(kwargs, 'logX', False)
         self.x_log_base = getValue(kwargs, 'xLogBase', 10)
         self.lodThreshold = getValue(kwargs, 'lodThreshold')
+        self.server_lod = getValue(kwargs, 'serverLod')
+        self.lod_range = None
+        self.lod_width = None
 
     def add(self, item):
         if isinstance(item, YAxis):
@@ -94,11 +104,92 @@ class XYChart(AbstractChart):
             self.constant_bands.append(item)
         elif isinstance(item, Graphics):
             self.graphics_list.append(item)
+            self.__dict__.setdefault('__graphics_by_uid__', {})[item.uid] = item
         elif isinstance(item, list):
             for elem in item:
                 self.add(elem)
         return self
 
+    def transform(self):
+        if isinstance(self.graphics_list, list):
+            for item in self.graphics_list:
+                if isinstance(item, Graphics):
+                    item.pop_changes()
+            if self.server_lod is not None:
+                self_copy = copy.copy(self)
+                self_copy.graphics_list = [self.reduce_graphics(item) for item in self.graphics_list]
+                return super(XYChart, self_copy).transform()
+        return super(XYChart, self).transform()
+
+    def get_graphics(self, uid):
+        graphics_by_uid = self.__dict__.get('__graphics_by_uid__')
+        if graphics_by_uid is None or len(graphics_by_uid) != len(self.graphics_list):
+            graphics_by_uid = {item.uid: item for item in self.graphics_list if isinstance(item, Graphics)}
+            self.__dict__['__graphics_by_uid__'] = graphics_by_uid
+        return graphics_by_uid.get(uid)
+
+    def reduce_graphics(self, item):
+        if self.server_lod is None or not isinstance(item, XYGraphics) or item.x is None or item.y is None:
+            return item
+        if self.lodThreshold is not None and len(item.x) <= self.lodThreshold and self.lod_range is None:
+            reduced = item
+        else:
+            reduced = LodReducer.reduce_graphics(item, self.lod_width or self.init_width,
+                                                 LodType(self.server_lod), self.lod_range)
+        item.__dict__['__lod_positions__'] = reduced.__dict__.get('__positions__')
+        return reduced
+
+    def setLodRange(self, lower, upper, width=None):
+        self.lod_range = None if lower is None and upper is None else [lower, upper]
+        self.lod_width = width
+        return self
+
+    def transform_patch(self, model, window=None, refresh=()):
+        graphics_models = model.get('graphics_list', [])
+        uids = [item.uid for item in self.graphics_list]
+        if uids[:len(graphics_models)] != [g.get('uid') for g in graphics_models]:
+            return None
+
+        changes = self.transform_model_changes(model)
+        items = {}
+        appended = {}
+        for item in self.graphics_list[:len(graphics_models)]:
+            tail = item.transform_appended(window) if isinstance(item, XYGraphics) else None
+            item_changes = item.transform_changes()
+            if item.uid in refresh or (self.server_lod is not None and
+                                       (tail is not None or 'x' in item_changes or 'y' in item_changes)):
+                items[item.uid] = self.reduce_graphics(item).transform()
+                continue
+            if item_changes:
+                items[item.uid] = item_changes
+            if tail is not None and 'x' not in item_changes and 'y' not in item_changes:
+                appended[item.uid] = tail
+        added = []
+        for item in self.graphics_list[len(graphics_models):]:
+            item.pop_changes()
+            added.append(self.reduce_graphics(item).transform())
+
+        return {'model': changes, 'items': items, 'added': added, 'appended': appended, 'window': window}
+
+    def transform_model_changes(self, model):
+        chart = copy.copy(self)
+        chart.graphics_list = []
+        chart_model = chart.transform()
+        changes = {}
+        for key, value in chart_model.items():
+            if key != 'graphics_list' and model.get(key) != value:
+                changes[key] = value
+        for key in model:
+            if key not in chart_model:
+                changes[key] = None
+        return changes
+
+    def transform_lod_patch(self, model):
+        items = {item.uid: self.reduce_graphics(item).transform() for item in self.graphics_list
+                 if isinstance(item, XYGraphics)}
+        return {'model': self.transform_model_changes(model), 'items': items, 'added': [], 'appended': {},
+                'window': None}
+
     def setYBound(self, lower, upper):
         self.y_lower_bound = lower
         self.y_upper_bound = upper
@@ -120,6 +211,7 @@ class HeatMapChart(XYChart):
         super(HeatMapChart, self).__init__(**kwargs)
         self.rows_limit = rows_limit
         self.column_limit = column_limit
+        self.aggregation = getValue(kwargs, 'aggregation', AggregationType.MEAN)
 
     @staticmethod
     def total_points(listOfData):
@@ -127,42 +219,67 @@ class HeatMapChart(XYChart):
 
     @staticmethod
     def find_step_for_column(row):
+        return HeatMapChart.find_step(len(row))
+
+    @staticmethod
+    def find_step(length):
         step = 2
-        while (int(len(row) / step)) > HeatMapChart.COLUMN_LIMIT:
+        while (int(length / step)) > HeatMapChart.COLUMN_LIMIT:
             step += 1
         return step
 
     @staticmethod
-    def limit_column_in_row(row):
-        if len(row) > HeatMapChart.COLUMN_LIMIT:
-            step = HeatMapChart.find_step_for_column(row)
-            limited_row = list(map(lambda index: row[index],
-                                   filter(lambda s: s % step == 0,
-                                          [index for index in range(len(row))])))
-            return limited_row
+    def aggregate_blocks(data, step, axis, aggregation=AggregationType.MEAN):
+        length = data.shape[axis]
+        blocks = -(-length // step)
+        padding = [(0, 0), (0, 0)]
+        padding[axis] = (0, blocks * step - length)
+        padded = np.pad(data, padding, constant_values=np.nan)
+        if axis == 1:
+            padded = padded.reshape(data.shape[0], blocks, step)
         else:
-            return row
+            padded = padded.reshape(blocks, step, data.shape[1])
+        block_axis = axis + 1
+        aggregation = AggregationType(aggregation)
+        if aggregation == AggregationType.MAX:
+            return np.fmax.reduce(padded, axis=block_axis)
+        if aggregation == AggregationType.MIN:
+            return np.fmin.reduce(padded, axis=block_axis)
+        missing = np.isnan(padded)
+        sums = np.where(missing, 0, padded).sum(axis=block_axis)
+        counts = (~missing).sum(axis=block_axis)
+        if aggregation == AggregationType.SUM:
+            return np.where(counts > 0, sums, np.nan)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return sums / counts
 
     @staticmethod
-    def limit_elements_in_row(listOfData):
-        return list(map(HeatMapChart.limit_column_in_row, listOfData))
+    def to_matrix(listOfData):
+        if isinstance(listOfData, np.ndarray) and listOfData.ndim == 2:
+            return listOfData.astype(np.float64), np.full(len(listOfData), listOfData.shape[1], dtype=np.int64)
+        rows = [np.asarray(row, dtype=np.float64).ravel() for row in listOfData]
+        lengths = np.array([len(row) for row in rows], dtype=np.int64)
+        matrix = np.full((len(rows), lengths.max(initial=0)), np.nan)
+        for index, row in enumerate(rows):
+            matrix[index, :len(row)] = row
+        return matrix, lengths
 
     @staticmethod
-    def limit_rows(listOfData):
-        step = HeatMapChart.find_step_for_column(listOfData)
-        limited_row = list(map(lambda index: listOfData[index],
-                               filter(lambda s: s % step == 0,
-                                      [index for index in range(len(listOfData))])))
-        return limited_row
-
-    @staticmethod
-    def limit_Heatmap(listOfData):
-        limited_elements_in_row = HeatMapChart.limit_elements_in_row(listOfData)
-        total_points = HeatMapChart.total_points(limited_elements_in_row)
+    def limit_Heatmap(listOfData, aggregation=AggregationType.MEAN):
+        matrix, lengths = HeatMapChart.to_matrix(listOfData)
+        if matrix.shape[1] > HeatMapChart.COLUMN_LIMIT:
+            # rows are NaN padded, so the stride follows the longest row
+            step = HeatMapChart.find_step(matrix.shape[1])
+            matrix = HeatMapChart.aggregate_blocks(matrix, step, 1, aggregation)
+            lengths = -(-lengths // step)
+        total_points = int(lengths.sum())
         too_many_rows = total_points > HeatMapChart.ROWS_LIMIT
         if too_many_rows:
-            return HeatMapChart.limit_rows(limited_elements_in_row)
-        return limited_elements_in_row
+            step = HeatMapChart.find_step(matrix.shape[0])
+            block_starts = np.arange(0, len(lengths), step)
+            matrix = HeatMapChart.aggregate_blocks(matrix, step, 0, aggregation)
+            lengths = np.maximum.reduceat(lengths, block_starts)
+        return [row[:length] for row, length in zip(matrix, lengths)]
 
     def transform(self):
         self_copy = copy.copy(self)
@@ -171,7 +288,7 @@ class HeatMapChart(XYChart):
         too_many_points = self_copy.totalNumberOfPoints > self.rows_limit
 
         if too_many_points:
-            limited_heat_map_data = self.limit_Heatmap(self_copy.graphics_list)
+            limited_heat_map_data = self.limit_Heatmap(self_copy.graphics_list, self.aggregation)
             self_copy.graphics_list = limited_heat_map_data
             self_copy.numberOfPointsToDisplay = self.total_points(self_copy.graphics_list)
 
@@ -182,7 +299,6 @@ class HeatMapChart(XYChart):
 
 class HistogramChart(XYChart):
     ROWS_LIMIT = 1000000
-    ROWS_LIMIT_T0_INDEX = 10000
 
     def __init__(self, **kwargs):
         self.log = getValue(kwargs, 'log', False)
@@ -208,23 +324,39 @@ class HistogramChart(XYChart):
             else:
                 self.colors = color
 
-    @staticmethod
-    def limit_points(x):
-        if len(x) >= HistogramChart.ROWS_LIMIT:
-            return x[0:HistogramChart.ROWS_LIMIT_T0_INDEX]
-        return x
-
     @staticmethod
     def total_number(listOfData):
         return max(list(map(lambda x: len(x), listOfData)))
 
+    def accumulate(self, chunks):
+        accumulator = HistogramAccumulator(self.bin_count, self.range_min, self.range_max)
+        if callable(chunks):
+            if self.range_min is None or self.range_max is None or self.bin_count is None:
+                for chunk in chunks():
+                    accumulator.scan(chunk)
+            chunks = chunks()
+        self.__dict__['__accumulator__'] = accumulator
+        for chunk in chunks:
+            if self.names is None and isinstance(chunk, pd.DataFrame):
+                self.names = [str(column) for column in chunk.columns]
+            accumulator.add(chunk)
+            yield accumulator
+
     def transform(self):
         self_copy = copy.copy(self)
         self_copy.totalNumberOfPoints = HistogramChart.total_number(self_copy.graphics_list)
-        self_copy.tooManyRows = self_copy.totalNumberOfPoints >= HistogramChart.ROWS_LIMIT
+        self_copy.tooManyRows = False
         self_copy.rowsLimitItems = HistogramChart.ROWS_LIMIT
-        self_copy.numberOfPointsToDisplay = str(HistogramChart.ROWS_LIMIT_T0_INDEX) + " items"
-        self_copy.graphics_list = list(map(HistogramChart.limit_points, self_copy.graphics_list))
+        accumulator = self.__dict__.get('__accumulator__')
+        if accumulator is not None:
+            self_copy.totalNumberOfPoints = accumulator.total()
+            self_copy.graphics_list = HistogramBinner.to_bins(accumulator.counts or [], accumulator.edges or [],
+                                                              self.normed, self.cumulative, self.displayMode)
+        else:
+            self_copy.graphics_list = HistogramBinner.bin_datasets(self.graphics_list, self.bin_count,
+                                                                   self.range_min, self.range_max, self.normed,
+                                                                   self.cumulative, self.displayMode)
+        self_copy.numberOfPointsToDisplay = str(sum(len(bins['x']) for bins in self_copy.graphics_list)) + " bins"
         return super(HistogramChart, self_copy).transform()
 
 
@@ -329,3 +461,6 @@ class CombinedChart(BaseObject):
         self.y_tickLabels_visible = True
         self.x_tickLabels_visible = True
         self.plot_type = 'Plot'
+
+    def transform(self):
+        return json.loads(json.dumps(self, cls=ColumnEncoder))
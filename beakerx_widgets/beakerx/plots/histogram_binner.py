@@ -0,0 +1,146 @@
+# Copyright 2021 TWO SIGMA OPEN SOURCE, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import math
+
+import numpy as np
+import pandas as pd
+
+
+class HistogramBinner:
+
+    @staticmethod
+    def to_values(dataset):
+        values = np.asarray(dataset, dtype=np.float64).ravel()
+        return values[np.isfinite(values)]
+
+    @staticmethod
+    def bin_count(size, bin_count=None):
+        if bin_count is not None:
+            return int(bin_count)
+        return max(int(math.ceil(math.log2(size) + 1)), 1) if size > 0 else 1
+
+    @staticmethod
+    def data_range(datasets, range_min=None, range_max=None):
+        if range_min is not None and range_max is not None:
+            return float(range_min), float(range_max)
+        lower = min((values.min() for values in datasets if len(values) > 0), default=None)
+        upper = max((values.max() for values in datasets if len(values) > 0), default=None)
+        if lower is None:
+            return None
+        return (float(range_min) if range_min is not None else float(lower),
+                float(range_max) if range_max is not None else float(upper))
+
+    @staticmethod
+    def to_bins(counts_list, edges_list, normed=False, cumulative=False, display_mode="OVERLAP"):
+        display_mode = getattr(display_mode, 'value', display_mode)
+        bins = []
+        previous = None
+        for index, (counts, edges) in enumerate(zip(counts_list, edges_list)):
+            y = counts.astype(np.float64)
+            if normed:
+                total = y.sum()
+                y = y / total if total > 0 else y
+            if cumulative:
+                y = np.cumsum(y)
+            if display_mode == "STACK" and previous is not None and len(previous) == len(y):
+                y = y + previous
+            previous = y
+            x = edges[:-1]
+            width = float(edges[1] - edges[0]) if len(edges) > 1 else 0.0
+            if display_mode == "SIDE_BY_SIDE":
+                width = width / len(counts_list)
+                x = x + width * index
+            bins.append({'type': 'HistogramBins', 'x': x, 'y': y, 'width': width})
+        return bins
+
+    @staticmethod
+    def bin_datasets(datasets, bin_count=None, range_min=None, range_max=None, normed=False, cumulative=False,
+                     display_mode="OVERLAP"):
+        sizes = [len(dataset) for dataset in datasets]
+        datasets = [HistogramBinner.to_values(dataset) for dataset in datasets]
+        data_range = HistogramBinner.data_range(datasets, range_min, range_max)
+        if data_range is None:
+            return []
+        counts_list = []
+        edges_list = []
+        for size, values in zip(sizes, datasets):
+            counts, edges = np.histogram(values, bins=HistogramBinner.bin_count(size, bin_count), range=data_range)
+            counts_list.append(counts)
+            edges_list.append(edges)
+        return HistogramBinner.to_bins(counts_list, edges_list, normed, cumulative, display_mode)
+
+
+class HistogramAccumulator:
+    def __init__(self, bin_count=None, range_min=None, range_max=None):
+        self.bin_count = bin_count
+        self.range_min = range_min
+        self.range_max = range_max
+        self.scanned = False
+        self.sizes = []
+        self.totals = []
+        self.lower = None
+        self.upper = None
+        self.counts = None
+        self.edges = None
+
+    @staticmethod
+    def to_datasets(chunk):
+        if isinstance(chunk, pd.DataFrame):
+            return [chunk[column].to_numpy() for column in chunk.columns]
+        if isinstance(chunk, (list, tuple)) and len(chunk) > 0 and isinstance(chunk[0], (list, np.ndarray, pd.Series)):
+            return list(chunk)
+        return [chunk]
+
+    @staticmethod
+    def add_sizes(sizes, datasets):
+        sizes.extend([0] * (len(datasets) - len(sizes)))
+        for index, dataset in enumerate(datasets):
+            sizes[index] += len(dataset)
+
+    def total(self):
+        return max(self.totals, default=0)
+
+    def scan(self, chunk):
+        datasets = HistogramAccumulator.to_datasets(chunk)
+        HistogramAccumulator.add_sizes(self.sizes, datasets)
+        for dataset in datasets:
+            values = HistogramBinner.to_values(dataset)
+            if len(values) > 0:
+                self.lower = values.min() if self.lower is None else min(self.lower, values.min())
+                self.upper = values.max() if self.upper is None else max(self.upper, values.max())
+        self.scanned = True
+
+    def prepare(self, dataset_count):
+        lower = self.range_min if self.range_min is not None else self.lower
+        upper = self.range_max if self.range_max is not None else self.upper
+        if lower is None or upper is None:
+            raise ValueError('to accumulate chunks, set rangeMin and rangeMax or pass a re-iterable source.')
+        if self.bin_count is None and not self.scanned:
+            raise ValueError('to accumulate chunks in a single pass, binCount needs to be set.')
+        self.edges = []
+        for index in range(dataset_count):
+            size = self.sizes[index] if index < len(self.sizes) else 0
+            bins = HistogramBinner.bin_count(size, self.bin_count)
+            self.edges.append(np.histogram_bin_edges(np.empty(0), bins=bins, range=(lower, upper)))
+        self.counts = [np.zeros(len(edges) - 1, dtype=np.int64) for edges in self.edges]
+
+    def add(self, chunk):
+        datasets = HistogramAccumulator.to_datasets(chunk)
+        if self.counts is None:
+            self.prepare(len(datasets))
+        HistogramAccumulator.add_sizes(self.totals, datasets)
+        for counts, edges, dataset in zip(self.counts, self.edges, datasets):
+            counts += np.histogram(HistogramBinner.to_values(dataset), bins=len(edges) - 1,
+                                   range=(edges[0], edges[-1]))[0]
@@ -0,0 +1,190 @@
+# Copyright 2021 TWO SIGMA OPEN SOURCE, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+from enum import Enum
+
+import numpy as np
+
+
+class LodType(Enum):
+    MIN_MAX = "MIN_MAX"
+    LTTB = "LTTB"
+    BOX = "BOX"
+
+
+class SortedXIndex:
+    def __init__(self, x, y):
+        if len(x) > 1 and not np.all(x[1:] >= x[:-1]):
+            self.order = np.argsort(x, kind='stable')
+            self.x = x[self.order]
+            self.y = y[self.order]
+        else:
+            self.order = None
+            self.x = x
+            self.y = y
+
+    @staticmethod
+    def create(x, y):
+        x = LodReducer.to_float_column(x)
+        y = LodReducer.to_float_column(y)
+        if x is None or y is None or len(x) != len(y):
+            return None
+        return SortedXIndex(x, y)
+
+    def slice(self, lower=None, upper=None):
+        start = 0 if lower is None else int(np.searchsorted(self.x, lower, side='left'))
+        stop = len(self.x) if upper is None else int(np.searchsorted(self.x, upper, side='right'))
+        return slice(max(start - 1, 0), max(min(stop + 1, len(self.x)), start))
+
+    def original(self, indices):
+        return indices if self.order is None else self.order[indices]
+
+    def positions(self, indices):
+        return indices if self.order is None else np.sort(self.order[indices])
+
+
+class LodReducer:
+    POINT_COLUMNS = ('bases', 'sizes', 'widths', 'colors', 'fills', 'outline_colors', 'shapes', 'tooltips')
+
+    @staticmethod
+    def reduce_graphics(item, buckets, lod_type, x_range=None):
+        index = item.x_index()
+        if index is None:
+            return item
+        visible = index.slice(*x_range) if x_range is not None else slice(0, len(index.x))
+        x = index.x[visible]
+        y = index.y[visible]
+        if len(x) <= LodReducer.points_budget(buckets, lod_type):
+            if len(x) == len(index.x):
+                return item
+            return LodReducer.take(item, index.positions(np.arange(visible.start, visible.stop)))
+        if lod_type == LodType.BOX:
+            box_x, box_y, first = LodReducer.box(x, y, buckets)
+            reduced = LodReducer.take(item, index.original(first + visible.start))
+            reduced.__dict__['x'] = LodReducer.like_column(item.x, box_x)
+            reduced.__dict__['y'] = box_y
+            return reduced
+        if lod_type == LodType.LTTB:
+            indices = LodReducer.lttb(x, y, LodReducer.points_budget(buckets, lod_type))
+        else:
+            indices = LodReducer.min_max(x, y, buckets)
+        return LodReducer.take(item, index.positions(indices + visible.start))
+
+    @staticmethod
+    def points_budget(buckets, lod_type):
+        return buckets if lod_type == LodType.BOX else 2 * buckets
+
+    @staticmethod
+    def to_float_column(values):
+        if values is None or isinstance(values, str):
+            return None
+        if isinstance(values, np.ndarray) and values.dtype.kind == 'M':
+            column = values.astype('datetime64[ms]').astype(np.int64).astype(np.float64)
+            column[np.isnat(values)] = np.nan
+            return column
+        try:
+            column = np.asarray(values, dtype=np.float64)
+        except (ValueError, TypeError):
+            try:
+                column = np.asarray([v['timestamp'] if isinstance(v, dict) else v for v in values],
+                                    dtype=np.float64)
+            except (ValueError, TypeError, KeyError):
+                return None
+        return column if column.ndim == 1 else None
+
+    @staticmethod
+    def bucket_ids(x, buckets):
+        lower = x.min()
+        span = x.max() - lower
+        if span == 0:
+            ids = np.zeros(len(x), dtype=np.int64)
+        else:
+            ids = np.minimum(((x - lower) / span * buckets).astype(np.int64, copy=False), buckets - 1)
+        return ids
+
+    @staticmethod
+    def min_max(x, y, buckets):
+        valid = np.isfinite(x) & np.isfinite(y)
+        candidates = np.flatnonzero(valid)
+        if len(candidates) == 0:
+            return candidates
+        ids = LodReducer.bucket_ids(x[candidates], buckets)
+        order = np.lexsort((y[candidates], ids))
+        ordered_ids = ids[order]
+        starts = np.flatnonzero(np.r_[True, ordered_ids[1:] != ordered_ids[:-1]])
+        ends = np.r_[starts[1:], len(order)] - 1
+        selected = np.concatenate((candidates[order[starts]], candidates[order[ends]],
+                                   candidates[[0, -1]]))
+        return np.unique(selected)
+
+    @staticmethod
+    def lttb(x, y, threshold):
+        valid = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+        if threshold < 3 or len(valid) <= threshold:
+            return valid
+        vx = x[valid]
+        vy = y[valid]
+        every = (len(valid) - 2) / (threshold - 2)
+        selected = np.empty(threshold, dtype=np.int64)
+        selected[0] = 0
+        selected[-1] = len(valid) - 1
+        a = 0
+        for i in range(threshold - 2):
+            start = int(i * every) + 1
+            stop = int((i + 1) * every) + 1
+            next_stop = min(int((i + 2) * every) + 1, len(valid))
+            avg_x = vx[stop:next_stop].mean()
+            avg_y = vy[stop:next_stop].mean()
+            areas = np.abs((vx[a] - avg_x) * (vy[start:stop] - vy[a]) -
+                           (vx[a] - vx[start:stop]) * (avg_y - vy[a]))
+            a = start + int(np.argmax(areas))
+            selected[i + 1] = a
+        return valid[np.unique(selected)]
+
+    @staticmethod
+    def box(x, y, buckets):
+        valid = np.isfinite(x) & np.isfinite(y)
+        candidates = np.flatnonzero(valid)
+        if len(candidates) == 0:
+            return np.empty(0), np.empty(0), candidates
+        ids = LodReducer.bucket_ids(x[candidates], buckets)
+        counts = np.bincount(ids, minlength=buckets)
+        filled = np.flatnonzero(counts)
+        box_x = np.bincount(ids, weights=x[candidates], minlength=buckets)[filled] / counts[filled]
+        box_y = np.bincount(ids, weights=y[candidates], minlength=buckets)[filled] / counts[filled]
+        first = np.full(buckets, len(candidates), dtype=np.int64)
+        np.minimum.at(first, ids, np.arange(len(candidates)))
+        return box_x, box_y, candidates[first[filled]]
+
+    @staticmethod
+    def like_column(original, values):
+        if isinstance(original, np.ndarray) and original.dtype.kind == 'M':
+            return values.astype(np.int64).astype('datetime64[ms]')
+        if any(isinstance(v, dict) for v in original):
+            return [{'type': 'Date', 'timestamp': int(v)} for v in values]
+        return values
+
+    @staticmethod
+    def take(item, indices):
+        reduced = copy.copy(item)
+        size = len(item.x)
+        for name in ('x', 'y') + LodReducer.POINT_COLUMNS:
+            values = item.__dict__.get(name)
+            if isinstance(values, np.ndarray) and len(values) == size:
+                reduced.__dict__[name] = values[indices]
+            elif isinstance(values, list) and len(values) == size:
+                reduced.__dict__[name] = [values[i] for i in indices]
+        reduced.__dict__['__positions__'] = indices
+        return reduced
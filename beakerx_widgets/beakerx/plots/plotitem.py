@@ -12,16 +12,22 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import copy
 import datetime as dt
+import json
 import math
+import threading
 import uuid
 from enum import Enum
 
 import numpy as np
 import pandas as pd
-from beakerx_base import Color, getValue, BaseObject, getColor, datetime_to_number, date_time_2_millis, padYs
+from beakerx_base import Color, getValue, BaseObject, getColor, datetime_to_number, date_time_2_millis, \
+    ObjectEncoder
 from dateutil.parser import parse
 
+from .lod_reducer import LodReducer, SortedXIndex
+
 
 class ShapeType(Enum):
     SQUARE = "SQUARE"
@@ -59,6 +65,13 @@ class LabelPositionType(Enum):
     BASE_INSIDE = "BASE_INSIDE"
 
 
+class AggregationType(Enum):
+    MEAN = "MEAN"
+    MAX = "MAX"
+    MIN = "MIN"
+    SUM = "SUM"
+
+
 class GradientColor:
     def __init__(self, *args):
         self.color = args[0]
@@ -98,6 +111,33 @@ class Graphics(BaseObject):
         self.keyTags = {}
         self.keys = []
 
+    def __setattr__(self, name, value):
+        super(Graphics, self).__setattr__(name, value)
+        self.__dict__.setdefault('__changes__', set()).add(name)
+
+    def __copy__(self):
+        clone = self.__class__.__new__(self.__class__)
+        clone.__dict__.update(self.__dict__)
+        clone.__dict__.pop('__changes__', None)
+        clone.__dict__.pop('__appended__', None)
+        clone.__dict__.pop('__x_index__', None)
+        clone.__dict__.pop('__lod_positions__', None)
+        return clone
+
+    def pop_changes(self):
+        return self.__dict__.pop('__changes__', set())
+
+    def transform(self):
+        return json.loads(json.dumps(self, cls=ColumnEncoder))
+
+    def transform_changes(self):
+        changes = {}
+        for name in self.pop_changes():
+            value = getattr(self, name, None)
+            if not callable(value):
+                changes[name] = value
+        return json.loads(json.dumps(changes, cls=ColumnEncoder))
+
     def onClick(self, on_click):
         if isinstance(on_click, str):
             self.clickTag = on_click
@@ -107,12 +147,17 @@ class Graphics(BaseObject):
         return self
 
     def onKey(self, key, on_key):
+        # reassign instead of mutating so the change is tracked for model patches
         if isinstance(on_key, str):
-            self.keyTags[key] = on_key
+            key_tags = dict(self.keyTags)
+            key_tags[key] = on_key
+            self.keyTags = key_tags
         else:
-            self.onKeyListeners[key] = on_key
+            listeners = dict(self.onKeyListeners)
+            listeners[key] = on_key
+            self.onKeyListeners = listeners
         if key not in self.keys:
-            self.keys.append(key)
+            self.keys = self.keys + [key]
         return self
 
     def fireClick(self, details):
@@ -156,18 +201,108 @@ def is_date(string):
         return False
 
 
+_NUMERIC_KINDS = ('integer', 'floating', 'mixed-integer-float', 'decimal', 'boolean')
+_DATE_KINDS = ('datetime64', 'datetime', 'date', 'string')
+
+
+def _to_millis(values):
+    dates = pd.DatetimeIndex(pd.to_datetime(values))
+    if dates.tz is not None:
+        dates = dates.tz_localize(None)
+    nanos = dates.asi8
+    millis = np.where(nanos < 0, -(-nanos // 1000000), nanos // 1000000)
+    return millis, dates.isna()
+
+
+def _convert_x_value(x):
+    if isinstance(x, float) and math.isnan(x):
+        return "NaN"
+    elif isinstance(x, dt.date) or isinstance(x, dt.time):
+        return date_time_2_millis(x.isoformat())
+    elif is_date(x):
+        return date_time_2_millis(x)
+    elif isinstance(x, np.datetime64):
+        return date_time_2_millis(x.__str__())
+    return x
+
+
+def _convert_x(values):
+    if isinstance(values, (pd.Series, pd.Index)):
+        values = values.array
+    kind = pd.api.types.infer_dtype(values, skipna=False)
+    if kind == 'empty':
+        return np.empty(0)
+    if kind in _NUMERIC_KINDS:
+        return _convert_y(values)
+    if kind in _DATE_KINDS:
+        try:
+            millis, missing = _to_millis(values)
+        except (ValueError, TypeError, OverflowError):
+            return [_convert_x_value(x) for x in values]
+        column = millis.astype('datetime64[ms]')
+        column[missing] = np.datetime64('NaT')
+        return column
+    return [_convert_x_value(x) for x in values]
+
+
+def _convert_y(values):
+    if isinstance(values, (pd.Series, pd.Index, pd.api.extensions.ExtensionArray)):
+        values = values.to_numpy()
+    try:
+        column = np.asarray(values)
+    except ValueError:
+        column = None
+    if column is None or column.ndim != 1 or column.dtype.kind not in 'iuf':
+        return ["NaN" if isinstance(y, float) and math.isnan(y) else y for y in values]
+    return column.astype(np.float64) if column.dtype.kind == 'f' else column.copy()
+
+
+def _column_to_list(column):
+    if not isinstance(column, np.ndarray):
+        return column
+    if column.ndim > 1:
+        return [_column_to_list(row) for row in column]
+    if column.dtype.kind == 'M':
+        missing = np.isnat(column)
+        converted = [{'type': 'Date', 'timestamp': ms}
+                     for ms in column.astype('datetime64[ms]').astype(np.int64).tolist()]
+    else:
+        missing = np.isnan(column) if column.dtype.kind == 'f' else np.zeros(0, dtype=bool)
+        converted = column.tolist()
+    for idx in np.flatnonzero(missing).tolist():
+        converted[idx] = "NaN"
+    return converted
+
+
+def _concat_columns(column, values):
+    if len(column) == 0:
+        return values
+    if isinstance(column, np.ndarray) and isinstance(values, np.ndarray) and \
+            (column.dtype.kind == 'M') == (values.dtype.kind == 'M'):
+        return np.concatenate((column, values))
+    return _column_to_list(column) + _column_to_list(values)
+
+
+class ColumnEncoder(ObjectEncoder):
+    def default(self, obj):
+        if isinstance(obj, np.ndarray):
+            return _column_to_list(obj)
+        return super(ColumnEncoder, self).default(obj)
+
+
+_APPEND_LOCK = threading.RLock()
+
+
 class XYGraphics(Graphics):
     def __init__(self, *args, **kwargs):
         super(XYGraphics, self).__init__(**kwargs)
         if len(args) > 0 and isinstance(args[0], pd.Series):
-            defX = args[0].index.tolist()
-            defY = args[0].tolist()
+            defX = args[0].index
+            defY = args[0]
         else:
             defY = getValue(kwargs, 'y')
 
             if defY is not None:
-                if isinstance(defY, pd.Series) or isinstance(defY, np.ndarray):
-                    defY = defY.tolist()
                 defX = list(range(0, len(defY)))
             else:
                 defX = []
@@ -175,32 +310,65 @@ class XYGraphics(Graphics):
         local_x = getValue(kwargs, 'x', defX)
 
         if local_x is not None:
-            if isinstance(local_x, pd.Series):
-                local_x = local_x.tolist()
-            self.x = [None] * len(local_x)
-            for idx in range(len(local_x)):
-                x = local_x[idx]
-                if isinstance(x, float) and math.isnan(x):
-                    self.x[idx] = "NaN"
-                elif isinstance(x, dt.date) or isinstance(x, dt.time):
-                    self.x[idx] = date_time_2_millis(x.isoformat())
-                elif is_date(x):
-                    self.x[idx] = date_time_2_millis(x)
-                elif isinstance(x, np.datetime64):
-                    self.x[idx] = date_time_2_millis(x.__str__())
-                else:
-                    self.x[idx] = x
+            self.x = _convert_x(local_x)
 
         self.y = defY
         if self.y is not None:
-            for idx in range(len(self.y)):
-                y = self.y[idx]
-                if isinstance(y, float) and math.isnan(y):
-                    self.y[idx] = "NaN"
+            self.y = _convert_y(self.y)
 
         self.display_name = getValue(kwargs, 'displayName')
         self.lod_filter = getValue(kwargs, 'lodFilter')
         self.tooltips = getValue(kwargs, 'tooltips')
+        self.onAppendListener = lambda *args: None
+
+    def __setattr__(self, name, value):
+        super(XYGraphics, self).__setattr__(name, value)
+        if name in ('x', 'y'):
+            self.__dict__.pop('__x_index__', None)
+
+    def x_index(self):
+        with _APPEND_LOCK:
+            if '__x_index__' not in self.__dict__:
+                self.__dict__['__x_index__'] = SortedXIndex.create(self.x, self.y)
+            return self.__dict__['__x_index__']
+
+    def source_index(self, index):
+        positions = self.__dict__.get('__lod_positions__')
+        if positions is None or index is None or not 0 <= index < len(positions):
+            return index
+        return int(positions[index])
+
+    def append(self, x, y):
+        return self.extend([x], [y])
+
+    def extend(self, xs, ys):
+        if len(xs) != len(ys):
+            raise ValueError('to extend the item, x and y need to be of the same length.')
+        with _APPEND_LOCK:
+            self.__dict__['x'] = _concat_columns(self.x if self.x is not None else [], _convert_x(xs))
+            self.__dict__['y'] = _concat_columns(self.y if self.y is not None else [], _convert_y(ys))
+            self.__dict__['__appended__'] = self.__dict__.get('__appended__', 0) + len(xs)
+            self.__dict__.pop('__x_index__', None)
+        self.onAppendListener(self)
+        return self
+
+    def pop_changes(self):
+        with _APPEND_LOCK:
+            self.__dict__.pop('__appended__', None)
+            return super(XYGraphics, self).pop_changes()
+
+    def transform_appended(self, window=None):
+        with _APPEND_LOCK:
+            appended = self.__dict__.pop('__appended__', 0)
+            if appended == 0:
+                return None
+            if window is not None:
+                self.__dict__['x'] = self.x[-window:]
+                self.__dict__['y'] = self.y[-window:]
+                self.__dict__.pop('__x_index__', None)
+                appended = min(appended, window)
+            tail = {'x': self.x[-appended:], 'y': self.y[-appended:]}
+        return json.loads(json.dumps(tail, cls=ColumnEncoder))
 
 
 class Line(XYGraphics):
@@ -217,7 +385,7 @@ class BasedXYGraphics(XYGraphics):
         super(BasedXYGraphics, self).__init__(*args, **kwargs)
         base = getValue(kwargs, 'base')
         if isinstance(base, list):
-            self.bases = base
+            self.bases = _convert_y(base)
         else:
             self.bases = getValue(kwargs, 'base', 0)
 
@@ -228,7 +396,7 @@ class Bars(BasedXYGraphics):
 
         width = getValue(kwargs, 'width')
         if isinstance(width, list):
-            self.widths = width
+            self.widths = _convert_y(width)
         else:
             self.width = width
 
@@ -257,7 +425,7 @@ class Points(XYGraphics):
 
         size = getColor(getValue(kwargs, 'size'))
         if isinstance(size, list):
-            self.sizes = size
+            self.sizes = _convert_y(size)
         else:
             self.size = getValue(kwargs, 'size', 6)
 
@@ -342,31 +510,59 @@ class YAxis(BaseObject):
 class XYStacker(BaseObject):
     def __init__(self, **kwargs):
         super(XYStacker, self).__init__(**kwargs)
+        self.align_by_x = getValue(kwargs, 'alignByX', False)
 
     def stack(self, graphicsList):
         if graphicsList is None or len(graphicsList) == 1:
             return graphicsList
+        if self.align_by_x:
+            xs, ys = XYStacker.align_by_x_values(graphicsList)
         else:
-            maxel = graphicsList[0]
-            for i in range(1, len(graphicsList)):
-                if len(graphicsList[i].y) > len(maxel.y):
-                    maxel = graphicsList[i]
-            padYs(graphicsList[0], maxel)
-            stackedList = [graphicsList[0]]
-            for gIndex in range(1, len(graphicsList)):
-                current = graphicsList[gIndex]
-                padYs(current, maxel)
-                previous = graphicsList[gIndex - 1]
-                currentYs = current.y
-                previousYs = previous.y
-
-                for yIndex in range(len(currentYs)):
-                    currentYs[yIndex] = currentYs[yIndex] + previousYs[yIndex]
-
-                current.bases = previousYs
-                stackedList.append(current)
-
-            return stackedList
+            xs, ys = XYStacker.align_by_position(graphicsList)
+        missing = np.isnan(ys)
+        stacked = np.cumsum(np.where(missing, 0, ys), axis=0)
+        stackedList = []
+        for index, graphics in enumerate(graphicsList):
+            current = copy.copy(graphics)
+            current.x = xs[index]
+            current.y = np.where(missing[index], np.nan, stacked[index])
+            if index > 0:
+                current.bases = stackedList[index - 1].y
+            stackedList.append(current)
+        return stackedList
+
+    @staticmethod
+    def float_column(graphics, name):
+        column = LodReducer.to_float_column(getattr(graphics, name))
+        if column is None:
+            raise ValueError('to stack the items, {} values need to be numeric.'.format(name))
+        return column
+
+    @staticmethod
+    def align_by_position(graphicsList):
+        longest = max(graphicsList, key=lambda g: len(g.y))
+        ys = np.empty((len(graphicsList), len(longest.y)))
+        for index, graphics in enumerate(graphicsList):
+            y = XYStacker.float_column(graphics, 'y')
+            ys[index, :len(y)] = y
+            ys[index, len(y):] = y[-1] if len(y) > 0 else np.nan
+        return [_concat_columns(g.x, longest.x[len(g.x):]) for g in graphicsList], ys
+
+    @staticmethod
+    def align_by_x_values(graphicsList):
+        columns = [(XYStacker.float_column(g, 'x'), XYStacker.float_column(g, 'y')) for g in graphicsList]
+        x = np.unique(np.concatenate([column_x for column_x, _ in columns]))
+        x = x[~np.isnan(x)]
+        ys = np.zeros((len(graphicsList), len(x)))
+        for index, (column_x, column_y) in enumerate(columns):
+            order = np.argsort(column_x, kind='stable')
+            previous = np.searchsorted(column_x[order], x, side='right') - 1
+            known = previous >= 0
+            ys[index, known] = column_y[order][previous[known]]
+        first_x = graphicsList[0].x
+        if isinstance(first_x, np.ndarray) and first_x.dtype.kind == 'M':
+            x = x.astype(np.int64).astype('datetime64[ms]')
+        return [x] * len(graphicsList), ys
 
 
 class Crosshair(BasedXYGraphics):
@@ -20,6 +20,7 @@ import pandas as pd
 
 from ..chart import HeatMap, XYChart
 from ..legend import LegendPosition
+from ..plotitem import AggregationType
 
 
 class TestHeatMap(unittest.TestCase):
@@ -85,6 +86,38 @@ class TestHeatMap(unittest.TestCase):
         self.assertEqual(model[XYChart.NUMBER_OF_POINTS_TO_DISPLAY], 10201)
         self.assertEqual(model[XYChart.ROWS_LIMIT_ITEMS], 100)
 
+    def test_should_keep_peak_with_max_aggregation(self):
+        # given
+        data = [[0] * 1001 for y in range(1001)]
+        data[503][507] = 100
+        # when
+        widget = HeatMap(100, 10, data=data, aggregation=AggregationType.MAX)
+        # then
+        rows = widget.model['graphics_list']
+        self.assertEqual(len(rows), 101)
+        self.assertEqual(rows[50][50], 100)
+        self.assertEqual(sum(map(sum, rows)), 100)
+
+    def test_should_average_blocks_by_default(self):
+        # given
+        data = [[x for x in range(200)] for y in range(2)]
+        # when
+        widget = HeatMap(100, 10, data=data)
+        # then
+        self.assertEqual(widget.model['graphics_list'][0][:2], [0.5, 2.5])
+
+    def test_should_aggregate_ragged_rows_by_longest_row(self):
+        # given
+        data = [[1, 2], [x for x in range(200)], [7]]
+        # when
+        widget = HeatMap(100, 10, data=data)
+        # then
+        rows = widget.model['graphics_list']
+        self.assertEqual([len(row) for row in rows], [1, 100, 1])
+        self.assertEqual(rows[0], [1.5])
+        self.assertEqual(rows[1][:2], [0.5, 2.5])
+        self.assertEqual(rows[2], [7.0])
+
     def test_support_data_frame_series(self):
         # given
         maxdepth = 1001
@@ -15,6 +15,7 @@
 import random
 import unittest
 
+import numpy as np
 import pandas as pd
 
 from ..chart import Histogram, HistogramChart, XYChart
@@ -38,7 +39,7 @@ class TestHistogram(unittest.TestCase):
         model = histogram.model
         self.assertFalse(model[XYChart.TOO_MANY_ROWS])
         self.assertEqual(model[XYChart.TOTAL_NUMBER_OF_POINTS], 0)
-        self.assertEqual(model[XYChart.NUMBER_OF_POINTS_TO_DISPLAY], str(HistogramChart.ROWS_LIMIT_T0_INDEX) + " items")
+        self.assertEqual(model[XYChart.NUMBER_OF_POINTS_TO_DISPLAY], "0 bins")
         self.assertEqual(model[XYChart.ROWS_LIMIT_ITEMS], HistogramChart.ROWS_LIMIT)
 
     def test_should_not_limit_data(self):
@@ -52,22 +53,23 @@ class TestHistogram(unittest.TestCase):
         model = histogram.model
         self.assertFalse(model[XYChart.TOO_MANY_ROWS])
         self.assertEqual(model[XYChart.TOTAL_NUMBER_OF_POINTS], 9999)
-        self.assertEqual(model[XYChart.NUMBER_OF_POINTS_TO_DISPLAY], str(10000) + " items")
+        self.assertEqual(model[XYChart.NUMBER_OF_POINTS_TO_DISPLAY], str(15) + " bins")
         self.assertEqual(model[XYChart.ROWS_LIMIT_ITEMS], HistogramChart.ROWS_LIMIT)
 
-    def test_should_limit_data(self):
+    def test_should_bin_all_data_in_kernel(self):
         # given
-        data = []
-        for x in range(1, 1000002):
-            data.append(random.gauss(0, 1))
+        data = np.random.normal(0, 1, 1000001)
         # when
-        histogram = Histogram(data=data)
+        histogram = Histogram(data=data, binCount=20)
         # then
         model = histogram.model
-        self.assertTrue(model[XYChart.TOO_MANY_ROWS])
+        self.assertFalse(model[XYChart.TOO_MANY_ROWS])
         self.assertEqual(model[XYChart.TOTAL_NUMBER_OF_POINTS], 1000001)
-        self.assertEqual(model[XYChart.NUMBER_OF_POINTS_TO_DISPLAY], str(10000) + " items")
         self.assertEqual(model[XYChart.ROWS_LIMIT_ITEMS], HistogramChart.ROWS_LIMIT)
+        bins = model['graphics_list'][0]
+        self.assertEqual(bins['type'], 'HistogramBins')
+        self.assertEqual(len(bins['x']), 20)
+        self.assertEqual(sum(bins['y']), 1000001)
 
     def test_support_data_frame(self):
         # given
@@ -75,7 +77,75 @@ class TestHistogram(unittest.TestCase):
         # when
         histogram = Histogram(data=df['data1'])
         # then
-        self.assertEqual(len(histogram.model['graphics_list'][0]), 9999)
+        self.assertEqual(sum(histogram.model['graphics_list'][0]['y']), 9999)
+
+    def test_should_apply_range_normed_and_cumulative(self):
+        # given
+        data = [1, 2, 2, 3, 3, 3, 10]
+        # when
+        histogram = Histogram(data=data, binCount=3, rangeMin=0, rangeMax=3, normed=True, cumulative=True)
+        # then
+        bins = histogram.model['graphics_list'][0]
+        self.assertEqual(bins['x'], [0, 1, 2])
+        self.assertEqual(bins['width'], 1)
+        self.assertEqual(bins['y'], [0, 1 / 6, 1])
+
+    def test_should_stack_and_place_side_by_side(self):
+        # given
+        data = [[1, 2, 2], [1, 1, 2]]
+        # when
+        stacked = Histogram(data=data, binCount=2, displayMode=Histogram.DisplayMode.STACK)
+        side_by_side = Histogram(data=data, binCount=2, displayMode=Histogram.DisplayMode.SIDE_BY_SIDE)
+        # then
+        self.assertEqual(stacked.model['graphics_list'][1]['y'], [3, 3])
+        self.assertEqual(side_by_side.model['graphics_list'][1]['x'], [1.25, 1.75])
+        self.assertEqual(side_by_side.model['graphics_list'][1]['width'], 0.25)
+
+    def test_should_accumulate_chunks_in_single_pass(self):
+        # given
+        data = np.random.default_rng(1).normal(size=10000)
+        chunks = [data[i:i + 1000] for i in range(0, len(data), 1000)]
+        # when
+        histogram = Histogram(chunks=iter(chunks), binCount=20, rangeMin=-5, rangeMax=5)
+        # then
+        expected = Histogram(data=data, binCount=20, rangeMin=-5, rangeMax=5)
+        self.assertEqual(histogram.model['totalNumberOfPoints'], 10000)
+        self.assertEqual(histogram.model['graphics_list'][0]['y'], expected.model['graphics_list'][0]['y'])
+
+    def test_should_accumulate_data_frame_chunks_in_two_passes(self):
+        # given
+        df = pd.DataFrame({'a': np.arange(100.0), 'b': np.arange(100.0) * 2})
+
+        def chunks():
+            return (df.iloc[i:i + 10] for i in range(0, 100, 10))
+
+        # when
+        histogram = Histogram(chunks=chunks)
+        # then
+        graphics_list = histogram.model['graphics_list']
+        self.assertEqual(len(graphics_list), 2)
+        self.assertEqual(sum(graphics_list[0]['y']), 100)
+        self.assertEqual(sum(graphics_list[1]['y']), 100)
+        self.assertEqual(graphics_list[0]['x'][0], 0)
+        self.assertEqual(histogram.chart.names, ['a', 'b'])
+
+    def test_should_refresh_displayed_histogram_after_each_chunk(self):
+        # given
+        histogram = Histogram(chunks=iter([[3.5]]), binCount=2, rangeMin=0, rangeMax=4)
+        totals = []
+        histogram.observe(lambda change: totals.append(change['new']['totalNumberOfPoints']), names='model')
+        # when
+        histogram.accumulate(iter([[1.0], [2.0, 3.0]]))
+        # then
+        self.assertEqual(totals, [1, 3])
+
+    def test_should_require_range_for_single_pass_chunks(self):
+        # given
+        chunks = iter([[1, 2, 3]])
+        # when
+        # then
+        with self.assertRaises(ValueError):
+            Histogram(chunks=chunks, binCount=10)
 
     def test_legend_default_position(self):
         # given
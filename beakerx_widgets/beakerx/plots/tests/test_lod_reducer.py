@@ -0,0 +1,131 @@
+# Copyright 2021 TWO SIGMA OPEN SOURCE, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import unittest
+
+import numpy as np
+
+from ..chart import Plot
+from ..lod_reducer import LodReducer, LodType
+from ..plotitem import Line, Points
+
+
+class TestLodReducer(unittest.TestCase):
+
+    def test_min_max_keeps_extremes_of_each_bucket(self):
+        # given
+        x = np.arange(1000, dtype=float)
+        y = np.sin(x / 10)
+        y[500] = 10
+        # when
+        indices = LodReducer.min_max(x, y, 10)
+        # then
+        self.assertLessEqual(len(indices), 22)
+        self.assertIn(500, indices)
+        self.assertIn(0, indices)
+        self.assertIn(999, indices)
+        self.assertTrue(np.all(np.diff(indices) > 0))
+
+    def test_lttb_returns_threshold_points(self):
+        # given
+        x = np.arange(1000, dtype=float)
+        y = np.cos(x / 7)
+        # when
+        indices = LodReducer.lttb(x, y, 50)
+        # then
+        self.assertEqual(len(indices), 50)
+        self.assertEqual(indices[0], 0)
+        self.assertEqual(indices[-1], 999)
+
+    def test_box_averages_buckets(self):
+        # given
+        x = np.arange(10, dtype=float)
+        y = np.arange(10, dtype=float) * 2
+        # when
+        box_x, box_y, first = LodReducer.box(x, y, 2)
+        # then
+        self.assertEqual(box_x.tolist(), [2.0, 7.0])
+        self.assertEqual(box_y.tolist(), [4.0, 14.0])
+        self.assertEqual(first.tolist(), [0, 5])
+
+    def test_reduce_graphics_keeps_point_attributes_aligned(self):
+        # given
+        points = Points(x=list(range(100)), y=list(range(100)), size=list(range(100)))
+        # when
+        reduced = LodReducer.reduce_graphics(points, 10, LodType.MIN_MAX)
+        # then
+        self.assertLess(len(reduced.x), 100)
+        self.assertEqual(reduced.x.tolist(), reduced.sizes.tolist())
+        self.assertEqual(len(points.x), 100)
+        self.assertEqual(reduced.uid, points.uid)
+
+    def test_plot_should_send_reduced_items(self):
+        # given
+        plot = Plot(initWidth=100, serverLod=LodType.MIN_MAX)
+        # when
+        plot.add(Line(y=list(np.random.rand(10000))))
+        # then
+        model = plot.model['graphics_list'][0]
+        self.assertLessEqual(len(model['x']), 202)
+        self.assertEqual(len(plot.chart.graphics_list[0].x), 10000)
+
+    def test_plot_should_not_reduce_small_items(self):
+        # given
+        plot = Plot(initWidth=100, serverLod="LTTB")
+        # when
+        plot.add(Line(y=[1, 2, 3]))
+        # then
+        self.assertEqual(plot.model['graphics_list'][0]['y'], [1, 2, 3])
+
+    def test_sorted_x_index_should_slice_unsorted_points(self):
+        # given
+        points = Points(x=[5, 1, 4, 2, 3], y=[50, 10, 40, 20, 30])
+        index = points.x_index()
+        # when
+        visible = index.slice(2, 3)
+        # then
+        self.assertEqual(index.x[visible].tolist(), [1.0, 2.0, 3.0, 4.0])
+        self.assertEqual(index.positions(np.arange(visible.start, visible.stop)).tolist(), [1, 2, 3, 4])
+
+    def test_zoom_should_send_finer_slice(self):
+        # given
+        plot = Plot(initWidth=100, serverLod=LodType.MIN_MAX)
+        plot.add(Line(y=list(np.random.rand(100000))))
+        messages = []
+        plot.send = lambda content, buffers=None: messages.append(content)
+        msg = {'content': {'data': {'content': {'event': 'onzoom', 'itemId': None,
+                                                'params': {'xl': 1000, 'xr': 1100, 'width': 300}}}}}
+        # when
+        plot._handle_msg(msg)
+        # then
+        model = plot.model['graphics_list'][0]
+        self.assertEqual(model['x'], list(range(899, 1202)))
+        self.assertEqual(plot.model['lod_range'], [900, 1200])
+        self.assertTrue(messages[0]['keepFocus'])
+        self.assertEqual(messages[0]['patch']['items'][model['uid']]['x'], model['x'])
+        self.assertEqual(messages[0]['patch']['model']['lod_range'], [900, 1200])
+        self.assertEqual(plot.model, plot.chart.transform())
+
+    def test_zoom_should_not_replace_action_details(self):
+        # given
+        plot = Plot(serverLod=LodType.MIN_MAX)
+        plot.send = lambda content, buffers=None: None
+        details = plot.details
+        msg = {'content': {'data': {'content': {'event': 'onzoom', 'itemId': None,
+                                                'params': {'xl': None, 'xr': None, 'width': 300}}}}}
+        # when
+        plot._handle_msg(msg)
+        # then
+        self.assertIs(plot.details, details)
@@ -15,11 +15,12 @@
 
 import unittest
 
+import numpy as np
 from beakerx_base import Color
 
-from ..chart import Plot
+from ..chart import NanoPlot, Plot
 from ..legend import LegendPosition
-from ..plotitem import StrokeType, Crosshair, Points, ShapeType, YAxis, Text, ConstantLine, ConstantBand
+from ..plotitem import StrokeType, Crosshair, Points, ShapeType, YAxis, Text, ConstantLine, ConstantBand, Line
 
 
 class TestPlot(unittest.TestCase):
@@ -168,3 +169,172 @@ class TestPlot(unittest.TestCase):
         # then
         self.assertEqual(plot.model['legend_position']['type'], "LegendPosition")
         self.assertEqual(plot.model['legend_position']['position'], "LEFT")
+
+    def test_should_send_numeric_columns_as_binary_buffers(self):
+        # given
+        plot = Plot(binaryTransport=True)
+        # when
+        plot.add(Line(x=[1, 2, 3], y=[1.5, float('nan'), 3.5]))
+        # then
+        state = plot.get_state('model')['model']
+        y = state['graphics_list'][0]['y']
+        self.assertEqual(y['type'], 'Buffer')
+        self.assertEqual(y['kind'], 'Number')
+        values = np.frombuffer(y['value'], dtype='<f8')
+        self.assertEqual(values[0], 1.5)
+        self.assertTrue(np.isnan(values[1]))
+        self.assertEqual(plot.model['graphics_list'][0]['y'], [1.5, 'NaN', 3.5])
+
+    def test_should_keep_numeric_strings_in_json(self):
+        # given
+        plot = NanoPlot(binaryTransport=True)
+        # when
+        plot.add(Points(x=['1600000000000000001', '1600000000000000002'], y=[1, 2]))
+        # then
+        state = plot.get_state('model')['model']
+        self.assertEqual(state['graphics_list'][0]['x'], ['1600000000000000001', '1600000000000000002'])
+        self.assertEqual(state['graphics_list'][0]['y'], ['1', '2'])
+
+    def test_should_send_one_stringified_patch_per_nano_plot_add(self):
+        # given
+        plot = NanoPlot().add(Points(x=[1], y=[1]))
+        messages = []
+        plot.send = lambda content, buffers=None: messages.append(content)
+        # when
+        plot.add(Points(x=[2], y=[3]))
+        # then
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(messages[0]['patch']['added'][0]['y'], ['3'])
+        self.assertEqual(plot.model, plot.chart.transform())
+
+    def test_should_send_json_lists_by_default(self):
+        # given
+        plot = Plot()
+        # when
+        plot.add(Line(x=[1, 2, 3], y=[1, 2, 3]))
+        # then
+        state = plot.get_state('model')['model']
+        self.assertEqual(state['graphics_list'][0]['y'], [1, 2, 3])
+
+    def test_should_send_only_changed_properties(self):
+        # given
+        line = Line(x=[1, 2, 3], y=[1, 2, 3])
+        plot = Plot().add(line)
+        messages = []
+        plot.send = lambda content, buffers=None: messages.append(content)
+        # when
+        line.color = '#ffff0000'
+        plot.setShowLegend(True)
+        # then
+        patch = messages[0]['patch']
+        self.assertEqual(patch['model'], {'show_legend': True})
+        self.assertEqual(patch['items'], {line.uid: {'color': '#ffff0000'}})
+        self.assertEqual(patch['added'], [])
+        self.assertEqual(plot.model, plot.chart.transform())
+
+    def test_should_send_key_actions_added_after_display(self):
+        # given
+        line = Line(x=[1, 2, 3], y=[1, 2, 3])
+        plot = Plot().add(line)
+        messages = []
+        plot.send = lambda content, buffers=None: messages.append(content)
+        # when
+        line.onKey('SHIFT', 'tag1')
+        plot.setShowLegend(True)
+        # then
+        patch = messages[0]['patch']
+        self.assertEqual(patch['items'][line.uid]['keys'], ['SHIFT'])
+        self.assertEqual(patch['items'][line.uid]['keyTags'], {'SHIFT': 'tag1'})
+        self.assertEqual(plot.model, plot.chart.transform())
+
+    def test_should_send_added_items_as_patch(self):
+        # given
+        plot = Plot().add(Line(x=[1, 2], y=[1, 2]))
+        messages = []
+        plot.send = lambda content, buffers=None: messages.append(content)
+        # when
+        plot.add(Points(x=[3], y=[4]))
+        # then
+        patch = messages[0]['patch']
+        self.assertEqual(len(patch['added']), 1)
+        self.assertEqual(patch['added'][0]['type'], 'Points')
+        self.assertEqual(len(plot.model['graphics_list']), 2)
+
+    def test_should_stream_appended_points_within_window(self):
+        # given
+        line = Line(x=[1, 2, 3], y=[1, 2, 3])
+        plot = Plot().add(line).stream(window=4, interval=0)
+        messages = []
+        plot.send = lambda content, buffers=None: messages.append(content)
+        # when
+        line.append(4, 4)
+        line.extend([5, 6], [5, float('nan')])
+        # then
+        self.assertEqual(len(messages), 2)
+        self.assertEqual(messages[1]['patch']['appended'], {line.uid: {'x': [5, 6], 'y': [5, 'NaN']}})
+        self.assertEqual(messages[1]['patch']['window'], 4)
+        self.assertEqual(line.x.tolist(), [3, 4, 5, 6])
+        self.assertEqual(plot.model['graphics_list'][0]['y'], [3, 4, 5, 'NaN'])
+
+    def test_should_coalesce_appends_within_interval(self):
+        # given
+        line = Line(x=[1], y=[1])
+        plot = Plot().add(line).stream(interval=60)
+        messages = []
+        plot.send = lambda content, buffers=None: messages.append(content)
+        # when
+        line.append(2, 2)
+        line.append(3, 3)
+        line.append(4, 4)
+        plot._flush_timer.cancel()
+        plot._flush_appends()
+        # then
+        self.assertEqual(len(messages), 2)
+        self.assertEqual(messages[1]['patch']['appended'], {line.uid: {'x': [3, 4], 'y': [3, 4]}})
+        self.assertEqual(plot.model, plot.chart.transform())
+
+    def test_should_fire_click_on_item_by_uid(self):
+        # given
+        clicked = []
+        lines = [Line(y=[1, 2]) for _ in range(3)]
+        lines[1].onClick(lambda details: clicked.append(details))
+        plot = Plot().add(lines)
+        msg = {'content': {'data': {'content': {'event': 'onclick', 'itemId': lines[1].uid,
+                                                'params': {'index': 1}}}}}
+        # when
+        plot._handle_msg(msg)
+        # then
+        self.assertEqual(len(clicked), 1)
+        self.assertIs(clicked[0].graphics, lines[1])
+        self.assertIs(plot.chart.get_graphics(lines[2].uid), lines[2])
+
+    def test_should_send_columns_edited_in_place_by_action_handler(self):
+        # given
+        def on_click(info):
+            info.graphics.y[info.index] += 1
+
+        line = Line(x=[1, 2, 3], y=[5, 6, 7]).onClick(on_click)
+        plot = Plot().add(line)
+        messages = []
+        plot.send = lambda content, buffers=None: messages.append(content)
+        msg = {'content': {'data': {'content': {'event': 'onclick', 'itemId': line.uid,
+                                                'params': {'index': 0}}}}}
+        # when
+        plot._handle_msg(msg)
+        # then
+        self.assertEqual(messages[0]['patch']['items'][line.uid]['y'], [6, 6, 7])
+        self.assertEqual(plot.model['graphics_list'][0]['y'], [6, 6, 7])
+
+    def test_should_map_click_index_of_reduced_item_to_source_index(self):
+        # given
+        y = [0] * 10000
+        y[7777] = 100
+        line = Line(y=y)
+        plot = Plot(initWidth=10, serverLod='MIN_MAX').add(line)
+        index = plot.model['graphics_list'][0]['y'].index(100)
+        msg = {'content': {'data': {'content': {'event': 'onclick', 'itemId': line.uid,
+                                                'params': {'index': index}}}}}
+        # when
+        plot._handle_msg(msg)
+        # then
+        self.assertEqual(plot.details.index, 7777)
@@ -34,3 +34,26 @@ class TestStacking(unittest.TestCase):
         # then
         model = plot.model
         self.assertEqual(len(model['graphics_list']), 2)
+
+    def test_stack_should_not_mutate_items(self):
+        # given
+        a1 = Area(y=[1, 5, 3])
+        a2 = Area(y=[7, 2])
+        # when
+        stacked = XYStacker().stack([a1, a2])
+        # then
+        self.assertEqual(stacked[1].transform()['y'], [8, 7, 5])
+        self.assertEqual(stacked[1].transform()['bases'], [1, 5, 3])
+        self.assertEqual(stacked[1].transform()['x'], [0, 1, 2])
+        self.assertEqual(a2.y.tolist(), [7, 2])
+
+    def test_stack_aligned_by_x(self):
+        # given
+        a1 = Area(x=[1, 2, 3], y=[1, 1, 1])
+        a2 = Area(x=[2, 4], y=[10, 20])
+        # when
+        stacked = XYStacker(alignByX=True).stack([a1, a2])
+        # then
+        self.assertEqual(stacked[0].transform()['x'], [1, 2, 3, 4])
+        self.assertEqual(stacked[0].transform()['y'], [1, 1, 1, 1])
+        self.assertEqual(stacked[1].transform()['y'], [1, 11, 11, 21])
@@ -0,0 +1,87 @@
+# Copyright 2021 TWO SIGMA OPEN SOURCE, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import datetime as dt
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from ..plotitem import Line, Points
+
+
+class TestXYGraphics(unittest.TestCase):
+
+    def test_numeric_columns_replace_nan(self):
+        # given
+        x = np.array([1.0, np.nan, 3.0])
+        y = [1, 2.5, float('nan')]
+        # when
+        line = Line(x=x, y=y)
+        # then
+        self.assertEqual(line.transform()['x'], [1.0, "NaN", 3.0])
+        self.assertEqual(line.transform()['y'], [1, 2.5, "NaN"])
+
+    def test_numeric_columns_are_stored_as_arrays(self):
+        # given
+        x = pd.Series(pd.to_datetime(['2015-02-04 15:00:00', None]))
+        # when
+        line = Line(x=x, y=[1, 2])
+        # then
+        self.assertEqual(line.x.dtype, np.dtype('datetime64[ms]'))
+        self.assertEqual(line.y.dtype, np.dtype('int64'))
+
+    def test_should_not_mutate_input_list(self):
+        # given
+        y = [1.0, float('nan')]
+        # when
+        Line(y=y)
+        # then
+        self.assertTrue(np.isnan(y[1]))
+
+    def test_datetime_index_of_series(self):
+        # given
+        series = pd.Series([1.0, 2.0], index=pd.to_datetime(['2015-02-04 15:00:00', '1960-05-05 01:02:03.5']))
+        # when
+        line = Line(series)
+        # then
+        self.assertEqual(line.transform()['x'], [{'type': 'Date', 'timestamp': 1423062000000},
+                                                 {'type': 'Date', 'timestamp': -304815476500}])
+        self.assertEqual(line.transform()['y'], [1.0, 2.0])
+
+    def test_datetime_column_with_missing_values(self):
+        # given
+        x = pd.Series(pd.to_datetime(['2015-02-04 15:00:00', None]))
+        # when
+        points = Points(x=x, y=[1, 2])
+        # then
+        self.assertEqual(points.transform()['x'], [{'type': 'Date', 'timestamp': 1423062000000}, "NaN"])
+
+    def test_string_dates(self):
+        # given
+        x = ['2015-02-04 15:00:00', '2015-02-05']
+        # when
+        line = Line(x=x, y=[1, 2])
+        # then
+        self.assertEqual(line.transform()['x'], [{'type': 'Date', 'timestamp': 1423062000000},
+                                                 {'type': 'Date', 'timestamp': 1423094400000}])
+
+    def test_mixed_column_falls_back_to_element_conversion(self):
+        # given
+        x = [dt.date(2015, 2, 5), 'abc', 5, float('nan')]
+        # when
+        line = Line(x=x, y=[1, 2, 3, 4])
+        # then
+        self.assertEqual(line.transform()['x'], [{'type': 'Date', 'timestamp': 1423094400000}, 'abc', 5, "NaN"])
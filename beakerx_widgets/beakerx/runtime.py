@@ -12,17 +12,23 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
+import atexit
 import base64
+import copy
 import datetime
+import functools
 import json
+import logging
 import math
 import os
 import time
-import urllib.error
-import urllib.parse
-import urllib.request
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 import IPython
+import dateutil.tz
 import numpy
 import pandas
 import requests
@@ -37,11 +43,18 @@ try:
     from beakerx_tabledisplay.table_display_runtim import BeakerXTabledisplay
 except ModuleNotFoundError:
     BeakerXTabledisplay = None
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
 
 from beakerx.plots import chart
 from beakerx.forms import easyforms
 from ipykernel.comm import Comm
-from traitlets import Unicode
+from traitlets import Int, Unicode
+
+ARROW_CONTENT_TYPE = 'application/vnd.apache.arrow.stream'
 
 
 class OutputContainer:
@@ -114,27 +127,6 @@ def isPrimitiveType(typ):
     return False
 
 
-def isListOfMaps(data):
-    if type(data) != list:
-        return False
-    for w in data:
-        if type(w) != dict:
-            return False
-        for v in w.values():
-            if not isPrimitiveType(type(v).__name__):
-                return False
-    return True
-
-
-def isDictionary(data):
-    if type(data) != dict:
-        return False
-    for v in data.values():
-        if not isPrimitiveType(type(v).__name__):
-            return False
-    return True
-
-
 def transformNaN(obj):
     if not isinstance(obj, float):
         return obj
@@ -187,203 +179,383 @@ def fixNaNsBack(obj):
             obj[x] = float('-inf')
 
 
+def transformNaNsColumn(values):
+    if values.dtype.kind == 'O':
+        return numpy.frompyfunc(transformNaN, 1, 1)(values).tolist()
+    if values.dtype.kind != 'f':
+        return values.tolist()
+    finite = numpy.isfinite(values)
+    if finite.all():
+        return values.tolist()
+    out = values.astype(object)
+    out[numpy.isnan(values)] = "NaN"
+    out[values == numpy.inf] = "Infinity"
+    out[values == -numpy.inf] = "-Infinity"
+    return out.tolist()
+
+
+def datetimeColumnValues(column):
+    series = pandas.Series(column)
+    if series.dt.tz is None:
+        series = series.dt.tz_localize(dateutil.tz.tzlocal(), ambiguous='NaT', nonexistent='NaT')
+    values = series.dt.tz_convert(None).to_numpy().astype('datetime64[ms]')
+    millis = values.astype(numpy.int64).tolist()
+    return [None if nat else {'type': "Date", 'timestamp': t} for t, nat in zip(millis, numpy.isnat(values))]
+
+
+def columnValues(column):
+    if isinstance(column, pandas.MultiIndex):
+        return column.tolist()
+    dtype = column.dtype
+    if isinstance(dtype, numpy.dtype) and dtype.kind in 'fiub':
+        return transformNaNsColumn(column.to_numpy())
+    if dtype.kind == 'M' or isinstance(dtype, pandas.DatetimeTZDtype):
+        return datetimeColumnValues(column)
+    return [transformNaN(v) for v in column.tolist()]
+
+
+def columnTypeName(column):
+    dtype = column.dtype
+    if isinstance(dtype, numpy.dtype) and dtype.kind in 'fiub':
+        return convertTypeName(dtype.name)
+    if dtype.kind == 'M' or isinstance(dtype, pandas.DatetimeTZDtype):
+        return "datetime"
+    if len(column) > 0:
+        return convertTypeName(type(column.to_numpy()[0]).__name__)
+    return "string"
+
+
+@functools.lru_cache(maxsize=None)
+def isPrimitiveClass(cls):
+    return isPrimitiveType(cls.__name__)
+
+
+@functools.lru_cache(maxsize=None)
+def primitiveKind(cls):
+    if not isPrimitiveClass(cls):
+        return 0
+    return 2 if issubclass(cls, float) else 1
+
+
+def listOfMapsTable(data):
+    columns = {}
+    floats = set()
+    size = len(data)
+    for i, w in enumerate(data):
+        if type(w) != dict:
+            return None
+        for k, v in w.items():
+            kind = primitiveKind(v.__class__)
+            if kind == 0:
+                return None
+            if kind == 2:
+                floats.add(k)
+            column = columns.get(k)
+            if column is None:
+                column = columns[k] = [''] * size
+            column[i] = v
+    for k in floats:
+        transformNaNs(columns[k])
+    out = {}
+    out['type'] = "TableDisplay"
+    out['subtype'] = "ListOfMaps"
+    out['columnNames'] = list(columns)
+    out['values'] = list(zip(*columns.values())) if len(columns) > 0 else [()] * size
+    return out
+
+
+def dictionaryTable(data):
+    for v in data.values():
+        if not isPrimitiveClass(type(v)):
+            return None
+    out = {}
+    out['type'] = "TableDisplay"
+    out['subtype'] = "Dictionary"
+    out['columnNames'] = ["Key", "Value"]
+    out['values'] = [[k, transformNaN(v)] for k, v in data.items()]
+    return out
+
+
 def transform(obj):
-    if type(obj) == bytes:
-        return str(obj)
-    if isListOfMaps(obj):
-        out = {}
-        out['type'] = "TableDisplay"
-        out['subtype'] = "ListOfMaps"
-        cols = []
-        for l in obj:
-            cols.extend(l.keys())
-        cols = list(set(cols))
-        out['columnNames'] = cols
-        vals = []
-        for l in obj:
-            row = []
-            for r in cols:
-                if r in l:
-                    row.append(transform(l[r]))
-                else:
-                    row.append('')
-            vals.append(row)
-        out['values'] = vals
-        return out
-    if isDictionary(obj):
-        out = {}
-        out['type'] = "TableDisplay"
-        out['subtype'] = "Dictionary"
-        out['columnNames'] = ["Key", "Value"]
-        values = []
-        for k, v in obj.items():
-            values.append([k, transform(v)])
-        out['values'] = values
-        return out
-    if type(obj) == dict:
-        out = {}
-        for k, v in obj.items():
-            out[k] = transformNR(v)
-        return out
     if type(obj) == list:
-        out = []
-        for v in obj:
-            out.append(transformNR(v))
-        return out
-    if isinstance(obj, OutputContainer):
-        out = {}
-        out['type'] = "OutputContainer"
-        items = []
-        for v in obj.getItems():
-            items.append(transform(v))
-        out['items'] = items
-        return out
-    if isinstance(obj, BeakerCodeCell):
-        out = {}
-        out['type'] = "BeakerCodeCell"
-        out['cellId'] = obj.getCellId()
-        out['evaluatorId'] = obj.getEvaluatorId()
-        out['code'] = obj.getCode()
-        out['outputtype'] = obj.getOutputType()
-        out['output'] = transformNR(obj.getOutput())
-        out['tags'] = obj.getTags()
-        return out
-    if isinstance(obj, BaseObject):
-        return obj.transform()
-    return transformNaN(obj)
+        table = listOfMapsTable(obj)
+        if table is not None:
+            return table
+    elif type(obj) == dict:
+        table = dictionaryTable(obj)
+        if table is not None:
+            return table
+    return transformNR(obj)
 
 
 def transformNR(obj):
-    if type(obj) == bytes:
-        return str(obj)
-    if type(obj) == dict:
-        out = {}
-        for k, v in obj.items():
-            out[k] = transformNR(v)
-        return out
-    if type(obj) == list:
-        out = []
-        for v in obj:
-            out.append(transformNR(v))
-        return out
-    if isinstance(obj, OutputContainer):
-        out = {}
-        out['type'] = "OutputContainer"
-        items = []
-        for v in obj.getItems():
-            items.append(transform(v))
-        out['items'] = items
-        return out
-    if isinstance(obj, BeakerCodeCell):
-        out = {}
-        out['type'] = "BeakerCodeCell"
-        out['cellId'] = obj.getCellId()
-        out['evaluatorId'] = obj.getEvaluatorId()
-        out['code'] = obj.getCode()
-        out['outputtype'] = obj.getOutputType()
-        out['output'] = transformNR(obj.getOutput())
-        out['tags'] = obj.getTags()
-        return out
-    if isinstance(obj, BaseObject):
-        return obj.transform()
+    handler = transformNRHandlers.get(obj.__class__)
+    if handler is None:
+        handler = transformNRHandlers[obj.__class__] = transformValue.dispatch(obj.__class__)
+    return handler(obj)
+
+
+def registerTransform(cls, func=None):
+    """Register func as the transform for instances of cls and its subclasses.
+
+    Works as a decorator, e.g. @registerTransform(MyType). Transforms must return
+    JSON-encodable values.
+    """
+    transformNRHandlers.clear()
+    return transformValue.register(cls, func)
+
+
+@functools.singledispatch
+def transformValue(obj):
     return transformNaN(obj)
 
 
-def transformBack(obj):
-    if type(obj) == dict:
-        out = {}
-        for k, v in obj.items():
-            out[str(k)] = transformBack(v)
-        if "type" in out:
-            if out['type'] == "Plot" \
-                or out['type'] == "TimePlot" \
-                or out['type'] == "NanoPlot" \
-                or out['type'] == "SimpleTimePlot" \
-                or out['type'] == "CombinedPlot":
-                return chart.transformBack(out)
-            if out['type'] == 'EasyForm':
-                return easyforms.transformBack(out)
-            if out['type'] == "BeakerCodeCell":
-                c = BeakerCodeCell(out['cellId'], out['evaluatorId'])
-                if 'code' in out:
-                    c.code = out['code']
-                if 'outputtype' in out:
-                    c.outputtype = out['outputtype']
-                if 'output' in out:
-                    c.output = transformBack(out['output'])
-                if 'tags' in out:
-                    c.tags = out['tags']
-                return c
-            if out['type'] == "OutputContainer":
-                c = OutputContainer()
-                if 'items' in out:
-                    for i in out['items']:
-                        c.addItem(i)
-                return c
-            if out['type'] == "Date":
-                return datetime.fromtimestamp(out["timestamp"] / 1000)
-            if out['type'] == "TableDisplay":
-                if 'subtype' in out:
-                    if out['subtype'] == "Dictionary":
-                        out2 = {}
-                        for r in out['values']:
-                            out2[r[0]] = fixNaNBack(r[1])
-                        if out['columnNames'][0] == "Index":
-                            return pandas.Series(out2)
-                        return out2
-                    if out['subtype'] == "Matrix":
-                        vals = out['values']
-                        fixNaNsBack(vals)
-                        return numpy.matrix(vals)
-                    if out['subtype'] == "ListOfMaps":
-                        out2 = []
-                        cnames = out['columnNames']
-                        for r in out['values']:
-                            out3 = {}
-                            for i in range(len(cnames)):
-                                if r[i] != '':
-                                    out3[cnames[i]] = r[i]
-                            out2.append(out3)
-                        return out2
-                # transform to dataframe
-                if ('hasIndex' in out) and (out['hasIndex'] == "true"):
-                    # first column becomes the index
-                    vals = out['values']
-                    cnames = out['columnNames'][1:]
-                    index = []
-                    for x in range(0, len(vals)):
-                        index.append(transformBack(vals[x][0]))
-                        v = vals[x][1:]
-                        fixNaNsBack(v)
-                        vals[x] = v
-                    if len(out['indexName']) > 1:
-                        index = pandas.MultiIndex.from_tuples(index, names=(out['indexName']))
-                    else:
-                        index = pandas.Index(index, name=', '.join((out['indexName'])))
-                    frame = pandas.DataFrame(data=vals, columns=cnames, index=index)
-                    return frame
-                else:
-                    vals = out['values']
-                    cnames = out['columnNames']
-                    for x in range(0, len(vals)):
-                        v = vals[x]
-                        fixNaNsBack(v)
-                        vals[x] = v
-                    return pandas.DataFrame(data=vals, columns=cnames)
-        return out
-    if type(obj) == list:
-        out = []
-        for v in obj:
-            out.append(transformBack(v))
-        return out
+transformNRHandlers = {}
+
+
+@registerTransform(bytes)
+def _(obj):
+    return str(obj)
+
+
+@registerTransform(dict)
+def _(obj):
+    return {k: transformNR(v) for k, v in obj.items()}
+
+
+@registerTransform(list)
+def _(obj):
+    return [transformNR(v) for v in obj]
+
+
+@registerTransform(OutputContainer)
+def _(obj):
+    out = {}
+    out['type'] = "OutputContainer"
+    out['items'] = [transform(v) for v in obj.getItems()]
+    return out
+
+
+@registerTransform(BeakerCodeCell)
+def _(obj):
+    out = {}
+    out['type'] = "BeakerCodeCell"
+    out['cellId'] = obj.getCellId()
+    out['evaluatorId'] = obj.getEvaluatorId()
+    out['code'] = obj.getCode()
+    out['outputtype'] = obj.getOutputType()
+    out['output'] = transformNR(obj.getOutput())
+    out['tags'] = obj.getTags()
+    return out
+
+
+@registerTransform(BaseObject)
+def _(obj):
+    return obj.transform()
+
+
+def transformBackCodeCell(out):
+    c = BeakerCodeCell(out['cellId'], out['evaluatorId'])
+    if 'code' in out:
+        c.code = out['code']
+    if 'outputtype' in out:
+        c.outputtype = out['outputtype']
+    if 'output' in out:
+        c.output = transformBack(out['output'])
+    if 'tags' in out:
+        c.tags = out['tags']
+    return c
+
+
+def transformBackOutputContainer(out):
+    c = OutputContainer()
+    if 'items' in out:
+        for i in out['items']:
+            c.addItem(i)
+    return c
+
+
+def transformBackDate(out):
+    return datetime.datetime.fromtimestamp(out["timestamp"] / 1000)
+
+
+def listOfMapsBack(cnames, values):
+    nested = (dict, list)
+    return [{c: (transformBack(v) if v.__class__ in nested else v) for c, v in zip(cnames, r) if v != ''}
+            for r in values]
+
+
+def transformBackTable(out):
+    if 'subtype' in out:
+        if out['subtype'] == "Dictionary":
+            out2 = {}
+            for r in transformBack(out['values']):
+                out2[r[0]] = fixNaNBack(r[1])
+            if out['columnNames'][0] == "Index":
+                return pandas.Series(out2)
+            return out2
+        if out['subtype'] == "Matrix":
+            vals = out['values']
+            try:
+                matrix = numpy.array(vals)
+                if matrix.dtype.kind not in 'iufb':
+                    # "NaN"/"Infinity" markers make numpy infer strings
+                    matrix = numpy.array(vals, dtype=numpy.float64)
+                return numpy.matrix(matrix)
+            except (ValueError, TypeError):
+                fixNaNsBack(vals)
+                return numpy.matrix(vals)
+        if out['subtype'] == "ListOfMaps":
+            return listOfMapsBack(out['columnNames'], out['values'])
+    # transform to dataframe
+    vals = out['values']
+    cnames = out['columnNames']
+    types = out.get('types')
+    if types is None or len(types) != len(cnames):
+        types = [None] * len(cnames)
+    columns = [columnBack([r[i] for r in vals], t) for i, t in enumerate(types)]
+    index = None
+    if ('hasIndex' in out) and (out['hasIndex'] == "true"):
+        # first column becomes the index
+        cnames = cnames[1:]
+        index = columns.pop(0)
+        if len(out['indexName']) > 1:
+            index = pandas.MultiIndex.from_tuples(index, names=(out['indexName']))
+        else:
+            index = pandas.Index(index, name=', '.join((out['indexName'])))
+    frame = pandas.DataFrame(dict(enumerate(columns)), index=index)
+    frame.columns = cnames
+    return frame
+
+
+def columnBack(values, typ):
     try:
-        if type(obj) == bytes:
-            obj = str(obj)
-    except Exception as e:
-        return obj
+        if typ == "double":
+            return numpy.array(values, dtype=numpy.float64)
+        if typ == "integer":
+            return numpy.array(values, dtype=numpy.int64)
+        if typ == "boolean":
+            column = numpy.array(values)
+            if column.dtype == numpy.bool_:
+                return column
+        if typ == "datetime":
+            return datetimeColumnBack(values)
+    except (ValueError, TypeError, KeyError, OverflowError):
+        pass
+    nested = (dict, list)
+    return [transformBack(v) if v.__class__ in nested else fixNaNBack(v) for v in values]
+
+
+def datetimeColumnBack(values):
+    millis = numpy.array([numpy.nan if v is None else v['timestamp'] for v in values], dtype=numpy.float64)
+    valid = ~numpy.isnan(millis)
+    # utc offsets only change on quarter hour boundaries
+    quarters, inverse = numpy.unique(millis[valid] // 900000, return_inverse=True)
+    offsets = numpy.array([time.localtime(q * 900).tm_gmtoff for q in quarters.tolist()], dtype=numpy.int64)
+    column = numpy.full(len(millis), numpy.datetime64('NaT'), dtype='datetime64[ms]')
+    column[valid] = (millis[valid].astype(numpy.int64) + offsets[inverse] * 1000).astype('datetime64[ms]')
+    return column
+
+
+transformBackTypes = {
+    "Plot": chart.transformBack,
+    "TimePlot": chart.transformBack,
+    "NanoPlot": chart.transformBack,
+    "SimpleTimePlot": chart.transformBack,
+    "CombinedPlot": chart.transformBack,
+    "EasyForm": lambda out: easyforms.transformBack(out),
+    "BeakerCodeCell": transformBackCodeCell,
+    "OutputContainer": transformBackOutputContainer,
+    "Date": transformBackDate,
+    "TableDisplay": transformBackTable,
+}
+
+
+@functools.singledispatch
+def transformBack(obj):
     return obj
 
 
+@transformBack.register(dict)
+def _(obj):
+    if obj.get('type') == "TableDisplay":
+        # cell values are converted by the table builders
+        return transformBackTable({str(k): v for k, v in obj.items()})
+    out = {str(k): transformBack(v) for k, v in obj.items()}
+    handler = transformBackTypes.get(out.get('type')) if type(out.get('type')) == str else None
+    return out if handler is None else handler(out)
+
+
+@transformBack.register(list)
+def _(obj):
+    return [transformBack(v) for v in obj]
+
+
+@transformBack.register(bytes)
+def _(obj):
+    return str(obj)
+
+
+def isArrowSupported(obj):
+    if pyarrow is None:
+        return False
+    if isinstance(obj, pandas.DataFrame):
+        # arrow stringifies column labels, keep other labels in json
+        return all(isinstance(c, str) for c in obj.columns)
+    if isinstance(obj, pandas.Series):
+        return True
+    return isinstance(obj, numpy.ndarray) and obj.ndim == 2 and obj.dtype.kind in 'fiub'
+
+
+def transformArrow(obj):
+    metadata = {}
+    if isinstance(obj, pandas.DataFrame):
+        metadata['beakerx.kind'] = "DataFrame"
+        table = pyarrow.Table.from_pandas(obj)
+    elif isinstance(obj, pandas.Series):
+        metadata['beakerx.kind'] = "Series"
+        if obj.name is not None:
+            metadata['beakerx.name'] = json.dumps(obj.name)
+        table = pyarrow.Table.from_pandas(obj.to_frame(name="value"))
+    else:
+        metadata['beakerx.kind'] = "Matrix"
+        table = pyarrow.Table.from_arrays([obj[:, i] for i in range(obj.shape[1])],
+                                          names=["c" + str(i) for i in range(obj.shape[1])])
+    table = table.replace_schema_metadata(dict(table.schema.metadata or {}, **metadata))
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def transformBackArrow(data):
+    source = data if hasattr(data, 'read') else pyarrow.py_buffer(data)
+    table = pyarrow.ipc.open_stream(source).read_all()
+    metadata = table.schema.metadata or {}
+    kind = metadata.get(b'beakerx.kind', b'DataFrame').decode()
+    if kind == "Matrix":
+        return numpy.matrix(numpy.column_stack([column.to_numpy() for column in table.columns]))
+    frame = table.to_pandas(split_blocks=True, self_destruct=True)
+    if kind == "Series":
+        name = metadata.get(b'beakerx.name')
+        return frame.iloc[:, 0].rename(None if name is None else json.loads(name))
+    return frame
+
+
+def encodeChunks(obj, rows=10000):
+    if type(obj) != pandas.core.frame.DataFrame or len(obj) <= rows:
+        yield json.dumps(transform(obj), cls=DataFrameEncoder).encode('utf-8')
+        return
+    encoder = DataFrameEncoder()
+    out = encoder.default(obj.iloc[:rows])
+    values = json.dumps(out.pop('values'), cls=DataFrameEncoder)
+    yield (json.dumps(out, cls=DataFrameEncoder)[:-1] + ', "values": ' + values[:-1]).encode('utf-8')
+    for start in range(rows, len(obj), rows):
+        values = json.dumps(encoder.default(obj.iloc[start:start + rows])['values'], cls=DataFrameEncoder)
+        yield (', ' + values[1:-1]).encode('utf-8')
+    yield b']}'
+
+
 # should be inner class to BeakerX
 class DataFrameEncoder(json.JSONEncoder):
     def default(self, obj):
@@ -399,15 +571,10 @@ class DataFrameEncoder(json.JSONEncoder):
             for i in range(obj.shape[1]):
                 cols.append("c" + str(i))
             out['columnNames'] = cols
-            vars = obj.tolist()
-            for x in range(0, len(vars)):
-                transformNaNs(vars[x])
-            out['values'] = vars
+            out['values'] = transformNaNsColumn(obj)
             return out
         if isinstance(obj, numpy.ndarray):
-            ret = obj.tolist()
-            transformNaNs(ret)
-            return ret
+            return transformNaNsColumn(obj)
         if type(obj) == datetime or type(obj) == datetime.date or type(obj).__name__ == 'Timestamp':
             out = {}
             out['type'] = "Date"
@@ -421,18 +588,9 @@ class DataFrameEncoder(json.JSONEncoder):
             out['columnNames'] = (['Index'] if obj.index.name is None else obj.index.names) + obj.columns.tolist()
             out['indexName'] = ['index'] if (len(obj.index.names) == 1) and (
                 obj.index.names[0] is None) else obj.index.names
-            vals = obj.values.tolist()
-            idx = obj.index.tolist()
-            for x in range(0, len(vals)):
-                vals[x] = [idx[x]] + vals[x]
-            ty = []
-            num = len(obj.columns.tolist())
-            x = 0
-            for x in range(0, num + 1):
-                ty.append(convertTypeName(type(vals[0][x]).__name__))
-            out['types'] = ty
-            for x in range(0, len(vals)):
-                transformNaNs(vals[x])
+            columns = [obj.index] + [obj.iloc[:, x] for x in range(len(obj.columns))]
+            out['types'] = [columnTypeName(column) for column in columns]
+            vals = list(zip(*[columnValues(column) for column in columns]))
             out['values'] = vals
             return out
         if type(obj) == pandas.core.series.Series:
@@ -457,27 +615,104 @@ class DataFrameEncoder(json.JSONEncoder):
         return json.JSONEncoder.default(self, obj)
 
 
+def formatterSample(size, count=64):
+    if size == 0:
+        return numpy.empty(0, dtype=numpy.int64)
+    return numpy.unique(numpy.linspace(0, size - 1, count).astype(numpy.int64))
+
+
+def formatterFingerprint(obj):
+    try:
+        if isinstance(obj, pandas.DataFrame):
+            sample = pandas.util.hash_pandas_object(obj.iloc[formatterSample(len(obj))]).to_numpy()
+            return obj.shape, tuple(obj.dtypes.astype(str)), obj.columns.tolist(), hash(sample.tobytes())
+        if isinstance(obj, pandas.Series):
+            sample = pandas.util.hash_pandas_object(obj.iloc[formatterSample(len(obj))]).to_numpy()
+            return obj.shape, str(obj.dtype), obj.name, hash(sample.tobytes())
+        if isinstance(obj, numpy.ndarray) and obj.dtype != object and obj.ndim > 0:
+            sample = numpy.ascontiguousarray(obj[formatterSample(len(obj))])
+            return obj.shape, obj.dtype.str, hash(sample.tobytes())
+    except TypeError:
+        pass
+    return None
+
+
 class MyJSONFormatter(IPython.core.formatters.BaseFormatter):
     format_type = Unicode('application/json')
+    cache_size = Int(256 * 1024 ** 2, help="Bytes of formatted output kept for re-displayed objects").tag(config=True)
+    max_size = Int(64 * 1024 ** 2, help="Output size above which tables are truncated to a preview").tag(config=True)
+
+    def __init__(self, **kwargs):
+        super(MyJSONFormatter, self).__init__(**kwargs)
+        self._cache = OrderedDict()
+        self._cache_bytes = 0
 
     def __call__(self, obj):
         try:
-            obj = transform(obj)
-            return json.dumps(obj, cls=DataFrameEncoder)
-        except Exception as e:
-            # print(e)
-            # traceback.print_exc()
+            fingerprint = formatterFingerprint(obj)
+            if fingerprint is None:
+                return self.format(obj)
+            cached = self._cache.get(id(obj))
+            if cached is not None and cached[0]() is obj and cached[1] == fingerprint:
+                self._cache.move_to_end(id(obj))
+                return cached[2]
+            output = self.format(obj)
+            self.cache(obj, fingerprint, output)
+            return output
+        except Exception:
+            logging.getLogger(__name__).exception('Could not format %s as application/json', type(obj).__name__)
             return None
 
+    def format(self, obj):
+        obj = transform(obj)
+        if isinstance(obj, pandas.DataFrame) and 0 < self.max_size:
+            rows = self.preview_rows(obj)
+            if rows < len(obj):
+                out = DataFrameEncoder().default(obj.iloc[:rows])
+                out['tooManyRows'] = True
+                out['rowLength'] = len(obj)
+                out['rowLimit'] = rows
+                return json.dumps(out, cls=DataFrameEncoder)
+        return json.dumps(obj, cls=DataFrameEncoder)
+
+    def preview_rows(self, obj, sample=1000):
+        if len(obj) <= sample:
+            return len(obj)
+        row_size = len(json.dumps(obj.iloc[:sample], cls=DataFrameEncoder)) / sample
+        return min(len(obj), max(1, int(self.max_size / row_size)))
+
+    def cache(self, obj, fingerprint, output):
+        self.uncache(id(obj))
+        if output is None or len(output) > self.cache_size:
+            return
+        key = id(obj)
+        self._cache[key] = (weakref.ref(obj, lambda ref: self.uncache(key, ref)), fingerprint, output)
+        self._cache_bytes += len(output)
+        while self._cache_bytes > self.cache_size:
+            self.uncache(next(iter(self._cache)))
+
+    def uncache(self, key, ref=None):
+        cached = self._cache.get(key)
+        if cached is None or (ref is not None and cached[0] is not ref):
+            return
+        del self._cache[key]
+        self._cache_bytes -= len(cached[2])
+
 
 from .beakerx_server import BeakerxZMQServer
 from queue import Queue
 
 
 class BeakerX:
+    BATCH_METHODS = frozenset(['get', 'set', 'unset', 'getMany', 'setMany', 'isDefined', 'evaluate', 'evaluateCode',
+                               'showStatus', 'clearStatus', 'showTransientStatus', 'getEvaluators', 'getVersion',
+                               'getVersionNumber', 'getCodeCells', 'setCodeCellBody', 'setCodeCellEvaluator',
+                               'setCodeCellTags'])
 
     def __init__(self):
         self._comm = None
+        self._client = AutotranslationClient()
+        self._control = NotebookControlClient(lambda: self.core_url)
         self._queue = Queue()
         self._server = BeakerxZMQServer(self._queue)
         self._url = self._server.url
@@ -512,10 +747,10 @@ class BeakerX:
         self._comm.open()
 
     def get(self, var):
-        result = autotranslation_get(var)
-        if result == 'undefined':
-            raise NameError('name \'' + var + '\' is not defined on the beakerx object')
-        return transformBack(json.loads(result))
+        return self._client.get(var)
+
+    def getMany(self, names):
+        return self._client.get_many(names)
 
     def set_session(self, id):
         self.session_id = id
@@ -525,14 +760,23 @@ class BeakerX:
         ip.display_formatter.formatters['application/json'] = MyJSONFormatter(parent=ip.display_formatter)
 
     def set(self, var, val):
-        autotranslation_update(var, val)
+        self._client.update(var, val)
         return self.set4(var, val, False, True)
 
+    def setMany(self, values):
+        self._client.update_many(values)
+        for var, val in values.items():
+            self.set4(var, val, False, True)
+
     def unset(self, var):
         return self.set4(var, None, True, True)
 
     def isDefined(self, var):
-        return autotranslation_get(var) != 'undefined'
+        try:
+            self._client.get(var)
+        except NameError:
+            return False
+        return True
 
     def createOutputContainer(self):
         return OutputContainer()
@@ -542,97 +786,80 @@ class BeakerX:
 
     def evaluate(self, filter):
         args = {'filter': filter, 'session': self.session_id}
-        req = urllib.request.Request(self.core_url + '/rest/notebookctrl/evaluate',
-                                     urllib.parse.urlencode(args).encode('utf8'))
-        conn = self._beaker_url_opener.open(req)
-        result = json.loads(conn.read().decode())
-        return transformBack(result)
+        result = self._control.post('/rest/notebookctrl/evaluate', args)
+        return transformBack(json.loads(result))
 
     def evaluateCode(self, evaluator, code):
         args = {'evaluator': evaluator, 'code': code, 'session': self.session_id}
-        req = urllib.request.Request(self.core_url + '/rest/notebookctrl/evaluateCode',
-                                     urllib.parse.urlencode(args).encode('utf8'))
-        conn = self._beaker_url_opener.open(req)
-        result = json.loads(conn.read().decode())
-        return transformBack(result)
+        result = self._control.post('/rest/notebookctrl/evaluateCode', args)
+        return transformBack(json.loads(result))
 
     def showStatus(self, msg):
         args = {'msg': msg, 'session': self.session_id}
-        req = urllib.request.Request(self.core_url + '/rest/notebookctrl/showStatus',
-                                     urllib.parse.urlencode(args).encode('utf8'))
-        conn = self._beaker_url_opener.open(req)
-        result = conn.read()
+        result = self._control.post('/rest/notebookctrl/showStatus', args)
         return result == "true"
 
     def clearStatus(self, msg):
         args = {'msg': msg, 'session': self.session_id}
-        req = urllib.request.Request(self.core_url + '/rest/notebookctrl/clearStatus',
-                                     urllib.parse.urlencode(args).encode('utf8'))
-        conn = self._beaker_url_opener.open(req)
-        result = conn.read()
+        result = self._control.post('/rest/notebookctrl/clearStatus', args)
         return result == "true"
 
     def showTransientStatus(self, msg):
         args = {'msg': msg, 'session': self.session_id}
-        req = urllib.request.Request(self.core_url + '/rest/notebookctrl/showTransientStatus',
-                                     urllib.parse.urlencode(args).encode('utf8'))
-        conn = self._beaker_url_opener.open(req)
-        result = conn.read()
+        result = self._control.post('/rest/notebookctrl/showTransientStatus', args)
         return result == "true"
 
     def getEvaluators(self):
-        req = urllib.request.Request(self.core_url + '/rest/notebookctrl/getEvaluators?' +
-                                     urllib.parse.urlencode({
-                                         'session': self.session_id}))
-        conn = self._beaker_url_opener.open(req)
-        result = json.loads(conn.read().decode())
-        return transformBack(result)
+        result = self._control.get('/rest/notebookctrl/getEvaluators', {'session': self.session_id})
+        return transformBack(json.loads(result))
 
     def getVersion(self):
-        req = urllib.request.Request(
-            self.core_url + '/rest/util/version?' + urllib.parse.urlencode({'session': self.session_id}))
-        conn = self._beaker_url_opener.open(req)
-        return transformBack(conn.read().decode())
+        return transformBack(self._control.get('/rest/util/version', {'session': self.session_id}))
 
     def getVersionNumber(self):
-        req = urllib.request.Request(
-            self.core_url + '/rest/util/getVersionInfo?' + urllib.parse.urlencode({'session': self.session_id}))
-        conn = self._beaker_url_opener.open(req)
-        result = json.loads(conn.read().decode())
+        result = json.loads(self._control.get('/rest/util/getVersionInfo', {'session': self.session_id}))
         return transformBack(result['version'])
 
     def getCodeCells(self, filter):
-        req = urllib.request.Request(self.core_url + '/rest/notebookctrl/getCodeCells?' +
-                                     urllib.parse.urlencode({
-                                         'filter': filter}))
-        conn = self._beaker_url_opener.open(req)
-        result = json.loads(conn.read().decode())
-        return transformBack(result)
+        result = self._control.get('/rest/notebookctrl/getCodeCells', {'filter': filter})
+        return transformBack(json.loads(result))
 
     def setCodeCellBody(self, name, body):
         args = {'name': name, 'body': body, 'session': self.session_id}
-        req = urllib.request.Request(self.core_url + '/rest/notebookctrl/setCodeCellBody',
-                                     urllib.parse.urlencode(args).encode('utf8'))
-        conn = self._beaker_url_opener.open(req)
-        result = conn.read()
+        result = self._control.post('/rest/notebookctrl/setCodeCellBody', args)
         return result == "true"
 
     def setCodeCellEvaluator(self, name, evaluator):
         args = {'name': name, 'evaluator': evaluator, 'session': self.session_id}
-        req = urllib.request.Request(self.core_url + '/rest/notebookctrl/setCodeCellEvaluator',
-                                     urllib.parse.urlencode(args).encode('utf8'))
-        conn = self._beaker_url_opener.open(req)
-        result = conn.read()
+        result = self._control.post('/rest/notebookctrl/setCodeCellEvaluator', args)
         return result == "true"
 
     def setCodeCellTags(self, name, tags):
         args = {'name': name, 'tags': tags, 'session': self.session_id}
-        req = urllib.request.Request(self.core_url + '/rest/notebookctrl/setCodeCellTags',
-                                     urllib.parse.urlencode(args).encode('utf8'))
-        conn = self._beaker_url_opener.open(req)
-        result = conn.read()
+        result = self._control.post('/rest/notebookctrl/setCodeCellTags', args)
         return result == "true"
 
+    def batch(self, calls):
+        for call in calls:
+            if call[0] not in BeakerX.BATCH_METHODS:
+                raise ValueError('\'' + str(call[0]) + '\' can not be called in a batch')
+        return [getattr(self, call[0])(*call[1:]) for call in calls]
+
+    def evaluate_async(self, filter):
+        return self._control.run_async(self.evaluate, filter)
+
+    def evaluateCode_async(self, evaluator, code):
+        return self._control.run_async(self.evaluateCode, evaluator, code)
+
+    def getCodeCells_async(self, filter):
+        return self._control.run_async(self.getCodeCells, filter)
+
+    def setCodeCellBody_async(self, name, body):
+        return self._control.run_async(self.setCodeCellBody, name, body)
+
+    def batch_async(self, calls):
+        return self._control.run_async(self.batch, calls)
+
     def runByTag(self, tag):
         arguments = dict(target_name='beakerx.tag.run')
         comm = Comm(**arguments)
@@ -674,6 +901,12 @@ class BeakerX:
         if '_server' == name:
             self.__dict__['_server'] = value
             return
+        if '_client' == name:
+            self.__dict__['_client'] = value
+            return
+        if '_control' == name:
+            self.__dict__['_control'] = value
+            return
         return self.set(name, value)
 
     def __getattr__(self, name):
@@ -685,6 +918,10 @@ class BeakerX:
             return self.__dict__['_queue']
         if '_server' == name:
             return self.__dict__['_server']
+        if '_client' == name:
+            return self.__dict__['_client']
+        if '_control' == name:
+            return self.__dict__['_control']
         return self.get(name)
 
     def __contains__(self, name):
@@ -694,24 +931,177 @@ class BeakerX:
         return self.unset(name)
 
 
+class AutotranslationClient:
+
+    def __init__(self, deep_copy_cached=False):
+        self._session = None
+        self._url = None
+        self._context_session = None
+        self._cache = {}
+        self._deep_copy_cached = deep_copy_cached
+
+    def _connect(self):
+        if self._session is None:
+            port = os.environ["BEAKERX_AUTOTRANSLATION_PORT"]
+            self._url = 'http://localhost:{0}/autotranslation/'.format(port)
+            self._context_session = get_context_session()
+            session = requests.Session()
+            session.headers['Authorization'] = get_auth_token()
+            if pyarrow is not None:
+                session.headers['Accept'] = ARROW_CONTENT_TYPE + ', application/json'
+            self._session = session
+            atexit.register(self.close)
+        return self._session
+
+    def close(self):
+        if self._session is None or not owns_context_session():
+            return
+        try:
+            self._session.delete(self._url + '{0}/'.format(self._context_session), timeout=5)
+        except requests.RequestException:
+            pass
+
+    def _variable_url(self, var):
+        return self._url + '{0}/{1}'.format(self._context_session, var)
+
+    def update(self, var, val):
+        session = self._connect()
+        self._cache.pop(var, None)
+        if isArrowSupported(val):
+            try:
+                arrow_data = transformArrow(val)
+            except (pyarrow.ArrowException, ValueError, TypeError):
+                arrow_data = None
+            if arrow_data is not None:
+                session.post(self._variable_url(var), data=pyarrow.BufferReader(arrow_data),
+                             headers={'Content-Type': ARROW_CONTENT_TYPE})
+                return
+        session.post(self._variable_url(var), data=encodeChunks(val), headers={'Content-Type': 'application/json'})
+
+    def get(self, var):
+        cached = self._cache.get(var)
+        headers = {} if cached is None else {'If-None-Match': cached[0]}
+        with self._connect().get(self._variable_url(var), headers=headers, stream=True) as result:
+            if result.status_code == 304:
+                return self._copy(cached[1])
+            if result.headers.get('Content-Type', '').startswith(ARROW_CONTENT_TYPE):
+                value = transformBackArrow(result.raw)
+            else:
+                value = AutotranslationClient.decode(var, result.content.decode())
+            return self._cached(var, result.headers.get('Etag'), value)
+
+    def _cached(self, var, etag, value):
+        if etag is None:
+            self._cache.pop(var, None)
+        else:
+            self._cache[var] = (etag, value)
+            value = self._copy(value)
+        return value
+
+    def _copy(self, value):
+        # shallow by default so cache hits stay cheap: rebinding keys, items or columns of a result
+        # does not reach the cache, but nested objects and frame data are shared with it.
+        # deep_copy_cached=True isolates results fully at the cost of copying the value on every read.
+        if self._deep_copy_cached:
+            return copy.deepcopy(value)
+        if isinstance(value, (pandas.DataFrame, pandas.Series)):
+            return value.copy(deep=False)
+        return copy.copy(value)
+
+    @staticmethod
+    def decode(var, result):
+        if result == 'undefined':
+            raise NameError('name \'' + var + '\' is not defined on the beakerx object')
+        return transformBack(json.loads(result))
+
+    def update_many(self, values):
+        session = self._connect()
+        batch = {}
+        for var, val in values.items():
+            self._cache.pop(var, None)
+            if isArrowSupported(val):
+                self.update(var, val)
+            else:
+                batch[var] = json.dumps(transform(val), cls=DataFrameEncoder)
+        if len(batch) > 0:
+            data = {}
+            data["sessionId"] = self._context_session
+            data["values"] = batch
+            session.post(self._url + 'batch', data=json.dumps(data))
+
+    def get_many(self, names):
+        session = self._connect()
+        names = list(names)
+        known = [var + ':' + self._cache[var][0] for var in names if var in self._cache]
+        result = session.get(self._url + 'batch',
+                             params={'sessionId': self._context_session, 'name': names, 'known': known})
+        result = json.loads(result.content.decode())
+        values = {}
+        missing = []
+        for var, value in result["values"].items():
+            if value == 'undefined':
+                missing.append(var)
+            else:
+                values[var] = self._cached(var, result["etags"].get(var), AutotranslationClient.decode(var, value))
+        for var in result["unchanged"]:
+            values[var] = self._copy(self._cache[var][1])
+        for var in result["arrow"]:
+            try:
+                values[var] = self.get(var)
+            except NameError:
+                missing.append(var)
+        return values, missing
+
+    def variables(self):
+        result = self._connect().get(self._url + '{0}/'.format(self._context_session))
+        return json.loads(result.content.decode())["names"]
+
+
+class NotebookControlClient:
+
+    def __init__(self, url_provider, pool_size=10):
+        self._url_provider = url_provider
+        self._pool_size = pool_size
+        self._session = None
+        self._url = None
+        self._executor = None
+
+    def _connect(self):
+        if self._session is None:
+            self._url = self._url_provider()
+            session = requests.Session()
+            session.trust_env = False
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self._pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self._session = session
+        return self._session
+
+    def post(self, path, args):
+        result = self._connect().post(self._url + path, data=args)
+        result.raise_for_status()
+        return result.content.decode()
+
+    def get(self, path, args):
+        result = self._connect().get(self._url + path, params=args)
+        result.raise_for_status()
+        return result.content.decode()
+
+    def run_async(self, f, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._pool_size, thread_name_prefix='beakerx-notebookctrl')
+        return asyncio.get_running_loop().run_in_executor(self._executor, f, *args)
+
+
+_autotranslation_client = AutotranslationClient()
+
+
 def autotranslation_update(var, val):
-    session_id = get_context_session()
-    port = os.environ["BEAKERX_AUTOTRANSLATION_PORT"]
-    url = 'http://localhost:{0}/autotranslation/'.format(port)
-    json_data = json.dumps(transform(val), cls=DataFrameEncoder)
-    data = {}
-    data["name"] = var
-    data["json"] = json_data
-    data["sessionId"] = session_id
-    requests.post(url, data=json.dumps(data), headers={'Authorization': get_auth_token()})
+    _autotranslation_client.update(var, val)
 
 
 def autotranslation_get(var):
-    port = os.environ["BEAKERX_AUTOTRANSLATION_PORT"]
-    session_id = get_context_session()
-    url = 'http://localhost:{0}/autotranslation/{1}/{2}'.format(port, session_id, var)
-    result = requests.get(url, headers={'Authorization': get_auth_token()})
-    return transformBack(result.content.decode())
+    return _autotranslation_client.get(var)
 
 
 def get_auth_token():
@@ -719,6 +1109,12 @@ def get_auth_token():
     return 'Basic ' + base64.b64encode(token_string.encode('utf-8')).decode()
 
 
+def owns_context_session():
+    # subkernels share the context session of their parent kernel
+    ipython = get_ipython()
+    return ipython is not None and hasattr(ipython, 'kernel') and len(ipython.kernel.parent.argv) != 3
+
+
 def get_context_session():
     kernel = get_ipython().kernel
     # if subkernel get session from extra start parameters
@@ -0,0 +1,145 @@
+# Copyright 2021 TWO SIGMA OPEN SOURCE, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from beakerx.autotranslation_store import AutotranslationStore, StoredValue
+
+
+class TestAutotranslationStore(unittest.TestCase):
+
+    def test_should_evict_least_recently_used_value_over_session_budget(self):
+        # given
+        store = AutotranslationStore(memory_budget=100, session_budget=10, spill_threshold=0, session_ttl=60)
+        store.set('s1', 'a', '1234')
+        store.set('s1', 'b', '1234')
+        store.get('s1', 'a')
+        # when
+        store.set('s1', 'c', '1234')
+        # then
+        self.assertEqual(store.get('s1', 'a'), '1234')
+        self.assertIsNone(store.get('s1', 'b'))
+        self.assertEqual(store.session_sizes['s1'], 8)
+
+    def test_should_spill_large_values_to_disk(self):
+        # given
+        store = AutotranslationStore(memory_budget=100, session_budget=100, spill_threshold=4, session_ttl=60)
+        # when
+        store.set('s1', 'a', b'\x00\x01\x02\x03')
+        store.set('s1', 'b', '12')
+        # then
+        self.assertEqual(store.get('s1', 'a'), b'\x00\x01\x02\x03')
+        self.assertTrue(os.path.exists(store.sessions['s1']['a'].path))
+        self.assertEqual(store.memory_size, 2)
+        store.close()
+
+    def test_should_count_utf8_bytes_of_text_values(self):
+        # given
+        store = AutotranslationStore(memory_budget=100, session_budget=100, spill_threshold=6, session_ttl=60)
+        # when
+        store.set('s1', 'a', '"éé"')
+        # then
+        self.assertEqual(store.session_sizes['s1'], 6)
+        self.assertIsNotNone(store.sessions['s1']['a'].path)
+        store.close()
+
+    def test_should_spill_least_recently_used_values_over_memory_budget(self):
+        # given
+        store = AutotranslationStore(memory_budget=5, session_budget=100, spill_threshold=10, session_ttl=60)
+        store.set('s1', 'a', '123')
+        # when
+        store.set('s2', 'b', '456')
+        # then
+        self.assertEqual(store.memory_size, 3)
+        self.assertIsNotNone(store.sessions['s1']['a'].path)
+        self.assertEqual(store.get('s1', 'a'), '123')
+        store.close()
+
+    def test_should_remove_session_with_spilled_files(self):
+        # given
+        store = AutotranslationStore(memory_budget=100, session_budget=100, spill_threshold=1, session_ttl=60)
+        store.set('s1', 'a', 'value')
+        path = store.sessions['s1']['a'].path
+        # when
+        store.remove_session('s1')
+        # then
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(store.names('s1'), [])
+        store.close()
+
+    def test_should_expire_idle_sessions(self):
+        # given
+        store = AutotranslationStore(memory_budget=100, session_budget=100, spill_threshold=0, session_ttl=60)
+        store.set('s1', 'a', '1')
+        # when
+        store.expire(time.time() + 120)
+        # then
+        self.assertIsNone(store.get('s1', 'a'))
+        self.assertEqual(store.memory_size, 0)
+
+    def test_should_not_expire_sessions_by_default(self):
+        # given
+        store = AutotranslationStore(memory_budget=100, session_budget=100, spill_threshold=0)
+        store.set('s1', 'a', '1')
+        # when
+        store.expire(time.time() + 365 * 24 * 60 * 60)
+        # then
+        self.assertEqual(store.get('s1', 'a'), '1')
+
+    def test_should_spill_without_holding_the_lock(self):
+        # given
+        store = AutotranslationStore(memory_budget=5, session_budget=100, spill_threshold=10, session_ttl=60)
+        store.set('s1', 'a', '123')
+        write = StoredValue.write
+        lock_free = []
+
+        def try_lock():
+            acquired = store.lock.acquire(blocking=False)
+            if acquired:
+                store.lock.release()
+            return acquired
+
+        def checked_write(stored, directory):
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                lock_free.append(executor.submit(try_lock).result())
+            return write(stored, directory)
+
+        # when
+        with patch.object(StoredValue, 'write', checked_write):
+            store.set('s2', 'b', '456')
+        # then
+        self.assertEqual(lock_free, [True])
+        self.assertEqual(store.get('s1', 'a'), '123')
+        store.close()
+
+    def test_should_keep_sizes_consistent_under_concurrent_access(self):
+        # given
+        store = AutotranslationStore(memory_budget=50, session_budget=1000, spill_threshold=20, session_ttl=60)
+
+        def update(i):
+            store.set('s1', 'v' + str(i % 10), 'x' * (i % 30))
+            store.get('s1', 'v' + str((i + 1) % 10))
+
+        # when
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(update, range(2000)))
+        # then
+        self.assertEqual(store.session_sizes['s1'], sum(v.size for v in store.sessions['s1'].values()))
+        self.assertEqual(store.memory_size, sum(v.size for v in store.memory.values()))
+        self.assertLessEqual(store.memory_size, 50)
+        store.close()
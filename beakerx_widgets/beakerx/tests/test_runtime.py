@@ -0,0 +1,493 @@
+# Copyright 2021 TWO SIGMA OPEN SOURCE, LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import json
+import os
+import unittest
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pandas as pd
+
+from beakerx.runtime import (AutotranslationClient, BeakerX, DataFrameEncoder, MyJSONFormatter, NotebookControlClient,
+                             transform, transformBack, pyarrow, isArrowSupported, transformArrow, transformBackArrow,
+                             registerTransform)
+
+
+class TestDataFrameEncoder(unittest.TestCase):
+
+    def test_should_encode_data_frame_by_columns(self):
+        # given
+        df = pd.DataFrame({'a': [1.0, np.nan, -np.inf],
+                           'b': [1, 2, 3],
+                           'c': ['x', None, 'z'],
+                           'd': [True, False, True]},
+                          index=pd.Index([5, 6, 7], name='k'))
+        # when
+        out = json.loads(json.dumps(df, cls=DataFrameEncoder))
+        # then
+        self.assertEqual(out['columnNames'], ['k', 'a', 'b', 'c', 'd'])
+        self.assertEqual(out['types'], ['integer', 'double', 'integer', 'string', 'boolean'])
+        self.assertEqual(out['values'], [[5, 1.0, 1, 'x', True], [6, 'NaN', 2, None, False],
+                                         [7, '-Infinity', 3, 'z', True]])
+
+    def test_should_encode_datetime_column(self):
+        # given
+        df = pd.DataFrame({'t': pd.to_datetime(['2020-01-01', None]).tz_localize('UTC')})
+        # when
+        out = json.loads(json.dumps(df, cls=DataFrameEncoder))
+        # then
+        self.assertEqual(out['types'][1], 'datetime')
+        self.assertEqual(out['values'][0][1], {'type': 'Date', 'timestamp': 1577836800000})
+        self.assertIsNone(out['values'][1][1])
+
+    def test_should_encode_empty_data_frame(self):
+        # given
+        df = pd.DataFrame({'a': pd.Series([], dtype=float)})
+        # when
+        out = json.loads(json.dumps(df, cls=DataFrameEncoder))
+        # then
+        self.assertEqual(out['types'], ['integer', 'double'])
+        self.assertEqual(out['values'], [])
+
+    def test_should_encode_matrix(self):
+        # given
+        matrix = np.array([[1.0, np.nan], [np.inf, 2.0]])
+        # when
+        out = json.loads(json.dumps(matrix, cls=DataFrameEncoder))
+        # then
+        self.assertEqual(out['subtype'], 'Matrix')
+        self.assertEqual(out['values'], [[1.0, 'NaN'], ['Infinity', 2.0]])
+
+
+class Temperature:
+    def __init__(self, degrees):
+        self.degrees = degrees
+
+
+@registerTransform(Temperature)
+def transform_temperature(obj):
+    return {'type': 'Temperature', 'degrees': obj.degrees}
+
+
+class TestTransform(unittest.TestCase):
+
+    def test_should_convert_list_of_maps_in_first_seen_column_order(self):
+        # given
+        data = [{'b': 1, 'a': float('nan')}, {'c': 'x'}]
+        # when
+        out = transform(data)
+        # then
+        self.assertEqual(out['subtype'], 'ListOfMaps')
+        self.assertEqual(out['columnNames'], ['b', 'a', 'c'])
+        self.assertEqual(out['values'], [(1, 'NaN', ''), ('', '', 'x')])
+
+    def test_should_convert_list_of_maps_back(self):
+        # given
+        data = {'type': 'TableDisplay', 'subtype': 'ListOfMaps', 'columnNames': ['a', 'b'],
+                'values': [[1, ''], ['', {'type': 'Date', 'timestamp': 0}]]}
+        # when
+        out = transformBack(data)
+        # then
+        self.assertEqual(out[0], {'a': 1})
+        self.assertEqual(list(out[1]), ['b'])
+        self.assertEqual(out[1]['b'].year, 1970)
+
+    def test_should_convert_nested_values(self):
+        # given
+        data = {'a': [1, {'b': b'x'}], 'c': float('inf')}
+        # when
+        out = transform(data)
+        # then
+        self.assertEqual(out, {'a': [1, {'b': "b'x'"}], 'c': 'Infinity'})
+
+    def test_should_use_registered_transform(self):
+        # given
+        data = [Temperature(21.5)]
+        # when
+        out = transform(data)
+        # then
+        self.assertEqual(out, [{'type': 'Temperature', 'degrees': 21.5}])
+
+    def test_should_transform_back_by_type(self):
+        # given
+        data = [{'type': 'OutputContainer', 'items': [1]}, {'type': 'Date', 'timestamp': 0}, {1: 'NaN'}]
+        # when
+        out = transformBack(data)
+        # then
+        self.assertEqual(out[0].getItems(), [1])
+        self.assertEqual(out[1].year, 1970)
+        self.assertEqual(out[2], {'1': 'NaN'})
+
+    def test_should_convert_data_frame_back_with_typed_columns(self):
+        # given
+        df = pd.DataFrame({'a': [1.0, np.nan, -np.inf],
+                           'b': [1, 2, 3],
+                           'c': ['x', None, 'NaN'],
+                           'd': [True, False, True],
+                           't': pd.to_datetime(['2020-01-01 10:00', None, '2020-07-01 10:00'])},
+                          index=pd.Index([5, 6, 7], name='k'))
+        data = json.loads(json.dumps(df, cls=DataFrameEncoder))
+        # when
+        out = transformBack(data)
+        # then
+        self.assertEqual(list(out.dtypes), [np.float64, np.int64, object, np.bool_, np.dtype('datetime64[ns]')])
+        pd.testing.assert_frame_equal(out, df.replace({'c': {'NaN': np.nan}}))
+
+    def test_should_convert_data_frame_back_without_types(self):
+        # given
+        data = {'type': 'TableDisplay', 'columnNames': ['a', 'b'], 'values': [[1, 'NaN'], [2, 'x']]}
+        # when
+        out = transformBack(data)
+        # then
+        self.assertEqual(list(out['a']), [1, 2])
+        self.assertTrue(np.isnan(out['b'][0]))
+        self.assertEqual(out['b'][1], 'x')
+
+    def test_should_convert_integer_column_with_missing_values_back(self):
+        # given
+        data = {'type': 'TableDisplay', 'columnNames': ['a'], 'types': ['integer'], 'values': [[1], ['NaN']]}
+        # when
+        out = transformBack(data)
+        # then
+        self.assertEqual(out['a'].dtype, np.float64)
+        self.assertTrue(np.isnan(out['a'][1]))
+
+    def test_should_convert_matrix_back(self):
+        # given
+        data = {'type': 'TableDisplay', 'subtype': 'Matrix', 'columnNames': ['c0', 'c1'],
+                'values': [[1.0, 'NaN'], ['Infinity', 2.0]]}
+        # when
+        out = transformBack(data)
+        # then
+        self.assertEqual(out.dtype, np.float64)
+        self.assertTrue(np.isnan(out[0, 1]))
+        self.assertEqual(out[1, 0], np.inf)
+
+    def test_should_keep_integer_matrix_dtype(self):
+        # given
+        data = json.loads(json.dumps(np.array([[1, 2], [3, 4]]), cls=DataFrameEncoder))
+        # when
+        out = transformBack(data)
+        # then
+        self.assertEqual(out.dtype, np.int64)
+        self.assertEqual(out.tolist(), [[1, 2], [3, 4]])
+
+
+class TestMyJSONFormatter(unittest.TestCase):
+
+    def test_should_reuse_output_for_unchanged_data_frame(self):
+        # given
+        formatter = MyJSONFormatter()
+        df = pd.DataFrame({'a': [1.0, 2.0], 'b': ['x', 'y']})
+        first = formatter(df)
+        # when
+        with patch('beakerx.runtime.transform') as transform_mock:
+            second = formatter(df)
+        # then
+        transform_mock.assert_not_called()
+        self.assertEqual(second, first)
+
+    def test_should_format_again_when_data_frame_changes(self):
+        # given
+        formatter = MyJSONFormatter()
+        df = pd.DataFrame({'a': [1.0, 2.0]})
+        formatter(df)
+        # when
+        df.iloc[1, 0] = 3.0
+        out = json.loads(formatter(df))
+        # then
+        self.assertEqual(out['values'][1], [1, 3.0])
+
+    def test_should_log_formatting_failure(self):
+        # given
+        formatter = MyJSONFormatter()
+        # when
+        with patch('beakerx.runtime.transform', side_effect=ValueError('boom')):
+            with self.assertLogs('beakerx.runtime', level='ERROR') as logs:
+                out = formatter(pd.DataFrame({'a': [1.0]}))
+        # then
+        self.assertIsNone(out)
+        self.assertIn('boom', logs.output[0])
+
+    def test_should_evict_output_over_cache_size(self):
+        # given
+        formatter = MyJSONFormatter(cache_size=1)
+        # when
+        formatter(pd.DataFrame({'a': [1.0, 2.0]}))
+        # then
+        self.assertEqual(len(formatter._cache), 0)
+
+    def test_should_truncate_large_data_frame_to_preview(self):
+        # given
+        formatter = MyJSONFormatter(max_size=20000)
+        df = pd.DataFrame({'a': np.arange(5000)})
+        # when
+        out = json.loads(formatter(df))
+        # then
+        self.assertTrue(out['tooManyRows'])
+        self.assertEqual(out['rowLength'], 5000)
+        self.assertEqual(len(out['values']), out['rowLimit'])
+        self.assertLess(out['rowLimit'], 5000)
+
+
+@unittest.skipIf(pyarrow is None, "pyarrow is not installed")
+class TestArrowTransform(unittest.TestCase):
+
+    def test_should_round_trip_data_frame(self):
+        # given
+        df = pd.DataFrame({'a': [1.0, np.nan], 'b': ['x', 'y']}, index=pd.Index([3, 4], name='k'))
+        # when
+        result = transformBackArrow(transformArrow(df))
+        # then
+        pd.testing.assert_frame_equal(result, df)
+
+    def test_should_round_trip_series(self):
+        # given
+        series = pd.Series([1, 2, 3], index=['a', 'b', 'c'], name='s')
+        # when
+        result = transformBackArrow(transformArrow(series))
+        # then
+        pd.testing.assert_series_equal(result, series)
+
+    def test_should_round_trip_matrix(self):
+        # given
+        matrix = np.arange(6.0).reshape(3, 2)
+        # when
+        result = transformBackArrow(transformArrow(matrix))
+        # then
+        np.testing.assert_array_equal(result, matrix)
+
+    def test_should_keep_json_for_other_values(self):
+        # given
+        # when
+        # then
+        self.assertFalse(isArrowSupported([1, 2]))
+        self.assertFalse(isArrowSupported(np.array([[object()]])))
+        self.assertFalse(isArrowSupported(pd.DataFrame([[1, 2]], columns=['a', 1])))
+
+    @patch.dict(os.environ, {'BEAKERX_AUTOTRANSLATION_PORT': '8123', 'BEAKERX_AUTOTRANSLATION_PASSWORD': 'secret'})
+    @patch('beakerx.runtime.get_context_session', return_value='session1')
+    @patch('beakerx.runtime.requests.Session')
+    def test_should_send_duplicate_columns_as_json(self, session_class, get_context_session):
+        # given
+        session = session_class.return_value
+        session.headers = {}
+        client = AutotranslationClient()
+        # when
+        client.update('x', pd.DataFrame([[1, 2]], columns=['a', 'a']))
+        # then
+        self.assertEqual(session.post.call_args[1]['headers'], {'Content-Type': 'application/json'})
+        out = json.loads(b''.join(session.post.call_args[1]['data']))
+        self.assertEqual(out['columnNames'], ['Index', 'a', 'a'])
+
+
+def response(status_code=200, headers=None, content=b''):
+    result = MagicMock(status_code=status_code, headers={} if headers is None else headers, content=content)
+    result.__enter__.return_value = result
+    return result
+
+
+class TestAutotranslationClient(unittest.TestCase):
+
+    @patch.dict(os.environ, {'BEAKERX_AUTOTRANSLATION_PORT': '8123', 'BEAKERX_AUTOTRANSLATION_PASSWORD': 'secret'})
+    @patch('beakerx.runtime.get_context_session', return_value='session1')
+    @patch('beakerx.runtime.requests.Session')
+    def test_should_reuse_session_for_all_requests(self, session_class, get_context_session):
+        # given
+        session = session_class.return_value
+        session.headers = {}
+        session.get.return_value = response(content=b'{"values": {"a": "[1]"}, "etags": {"a": "\\"v1\\""}, '
+                                                     b'"arrow": [], "unchanged": []}')
+        client = AutotranslationClient()
+        # when
+        client.update_many({'a': [1], 'b': 2})
+        values, missing = client.get_many(['a'])
+        # then
+        session_class.assert_called_once()
+        get_context_session.assert_called_once()
+        self.assertTrue(session.headers['Authorization'].startswith('Basic '))
+        session.post.assert_called_once()
+        self.assertEqual(session.post.call_args[0][0], 'http://localhost:8123/autotranslation/batch')
+        self.assertEqual(json.loads(session.post.call_args[1]['data'])['values'], {'a': '[1]', 'b': '2'})
+        session.get.assert_called_once_with('http://localhost:8123/autotranslation/batch',
+                                            params={'sessionId': 'session1', 'name': ['a'], 'known': []})
+        self.assertEqual(values, {'a': [1]})
+        self.assertEqual(missing, [])
+
+    @patch.dict(os.environ, {'BEAKERX_AUTOTRANSLATION_PORT': '8123', 'BEAKERX_AUTOTRANSLATION_PASSWORD': 'secret'})
+    @patch('beakerx.runtime.get_context_session', return_value='session1')
+    @patch('beakerx.runtime.requests.Session')
+    def test_should_report_undefined_names_of_batch_separately(self, session_class, get_context_session):
+        # given
+        session = session_class.return_value
+        session.headers = {}
+        session.get.return_value = response(content=b'{"values": {"a": "[1]", "b": "undefined"}, '
+                                                     b'"etags": {"a": "\\"v1\\""}, "arrow": [], "unchanged": []}')
+        client = AutotranslationClient()
+        # when
+        values, missing = client.get_many(['a', 'b'])
+        # then
+        self.assertEqual(values, {'a': [1]})
+        self.assertEqual(missing, ['b'])
+
+    @patch.dict(os.environ, {'BEAKERX_AUTOTRANSLATION_PORT': '8123', 'BEAKERX_AUTOTRANSLATION_PASSWORD': 'secret'})
+    @patch('beakerx.runtime.get_context_session', return_value='session1')
+    @patch('beakerx.runtime.requests.Session')
+    def test_should_return_cached_value_when_not_modified(self, session_class, get_context_session):
+        # given
+        session = session_class.return_value
+        session.headers = {}
+        client = AutotranslationClient()
+        session.get.return_value = response(headers={'Etag': '"v1"'}, content=b'{"a": 1}')
+        first = client.get('x')
+        session.get.return_value = response(status_code=304, headers={'Etag': '"v1"'})
+        # when
+        second = client.get('x')
+        # then
+        self.assertEqual(second, first)
+        self.assertIsNot(second, first)
+        self.assertEqual(session.get.call_args[1]['headers'], {'If-None-Match': '"v1"'})
+
+    @patch.dict(os.environ, {'BEAKERX_AUTOTRANSLATION_PORT': '8123', 'BEAKERX_AUTOTRANSLATION_PASSWORD': 'secret'})
+    @patch('beakerx.runtime.get_context_session', return_value='session1')
+    @patch('beakerx.runtime.requests.Session')
+    def test_should_not_share_cached_value_with_caller(self, session_class, get_context_session):
+        # given
+        session = session_class.return_value
+        session.headers = {}
+        client = AutotranslationClient()
+        session.get.return_value = response(headers={'Etag': '"v1"'}, content=b'{"a": [1, 2]}')
+        first = client.get('x')
+        first['a'] = 3
+        session.get.return_value = response(status_code=304, headers={'Etag': '"v1"'})
+        # when
+        second = client.get('x')
+        second['b'] = 4
+        third = client.get('x')
+        # then
+        self.assertEqual(second, {'a': [1, 2], 'b': 4})
+        self.assertEqual(third, {'a': [1, 2]})
+
+    @patch.dict(os.environ, {'BEAKERX_AUTOTRANSLATION_PORT': '8123', 'BEAKERX_AUTOTRANSLATION_PASSWORD': 'secret'})
+    @patch('beakerx.runtime.get_context_session', return_value='session1')
+    @patch('beakerx.runtime.requests.Session')
+    def test_should_share_data_frame_values_with_cache(self, session_class, get_context_session):
+        # given
+        session = session_class.return_value
+        session.headers = {}
+        client = AutotranslationClient()
+        content = json.dumps(pd.DataFrame({'a': [1.0, 2.0]}), cls=DataFrameEncoder).encode()
+        session.get.return_value = response(headers={'Etag': '"v1"'}, content=content)
+        first = client.get('x')
+        session.get.return_value = response(status_code=304, headers={'Etag': '"v1"'})
+        # when
+        second = client.get('x')
+        second['b'] = 1
+        # then
+        self.assertIsNot(second, first)
+        self.assertTrue(np.shares_memory(second['a'].values, first['a'].values))
+        self.assertNotIn('b', client.get('x'))
+
+    @patch.dict(os.environ, {'BEAKERX_AUTOTRANSLATION_PORT': '8123', 'BEAKERX_AUTOTRANSLATION_PASSWORD': 'secret'})
+    @patch('beakerx.runtime.get_context_session', return_value='session1')
+    @patch('beakerx.runtime.requests.Session')
+    def test_should_deep_copy_cached_values_when_configured(self, session_class, get_context_session):
+        # given
+        session = session_class.return_value
+        session.headers = {}
+        client = AutotranslationClient(deep_copy_cached=True)
+        session.get.return_value = response(headers={'Etag': '"v1"'}, content=b'{"a": [1, 2]}')
+        first = client.get('x')
+        first['a'].append(3)
+        session.get.return_value = response(status_code=304, headers={'Etag': '"v1"'})
+        # when
+        second = client.get('x')
+        # then
+        self.assertEqual(second, {'a': [1, 2]})
+
+    @patch.dict(os.environ, {'BEAKERX_AUTOTRANSLATION_PORT': '8123', 'BEAKERX_AUTOTRANSLATION_PASSWORD': 'secret'})
+    @patch('beakerx.runtime.owns_context_session', return_value=True)
+    @patch('beakerx.runtime.get_context_session', return_value='session1')
+    @patch('beakerx.runtime.requests.Session')
+    def test_should_delete_session_variables_on_close(self, session_class, get_context_session, owns_context_session):
+        # given
+        session = session_class.return_value
+        session.headers = {}
+        client = AutotranslationClient()
+        client.update('x', 1)
+        # when
+        client.close()
+        # then
+        session.delete.assert_called_once_with('http://localhost:8123/autotranslation/session1/', timeout=5)
+
+    @patch.dict(os.environ, {'BEAKERX_AUTOTRANSLATION_PORT': '8123', 'BEAKERX_AUTOTRANSLATION_PASSWORD': 'secret'})
+    @patch('beakerx.runtime.get_context_session', return_value='session1')
+    @patch('beakerx.runtime.requests.Session')
+    def test_should_raise_name_error_for_undefined_variable(self, session_class, get_context_session):
+        # given
+        session = session_class.return_value
+        session.headers = {}
+        session.get.return_value = response(content=b'undefined')
+        client = AutotranslationClient()
+        # when
+        # then
+        with self.assertRaises(NameError):
+            client.get('x')
+
+
+class TestNotebookControlClient(unittest.TestCase):
+
+    @patch('beakerx.runtime.requests.Session')
+    def test_should_reuse_session_for_control_calls(self, session_class):
+        # given
+        session = session_class.return_value
+        session.post.return_value = response(content=b'true')
+        url_provider = MagicMock(return_value='http://localhost:8801')
+        beakerx = MagicMock(session_id='session1', _control=NotebookControlClient(url_provider))
+        # when
+        results = [BeakerX.setCodeCellBody(beakerx, 'cell1', '1 + 1'), BeakerX.showStatus(beakerx, 'done')]
+        # then
+        self.assertEqual(results, [True, True])
+        session_class.assert_called_once()
+        url_provider.assert_called_once()
+        session.post.assert_any_call('http://localhost:8801/rest/notebookctrl/setCodeCellBody',
+                                     data={'name': 'cell1', 'body': '1 + 1', 'session': 'session1'})
+
+    @patch('beakerx.runtime.requests.Session')
+    def test_should_run_control_calls_asynchronously(self, session_class):
+        # given
+        session = session_class.return_value
+        session.get.return_value = response(content=b'[{"cellId": "c1"}]')
+        client = NotebookControlClient(lambda: 'http://localhost:8801')
+
+        async def get_code_cells():
+            return await client.run_async(client.get, '/rest/notebookctrl/getCodeCells', {'filter': 'c1'})
+
+        # when
+        result = asyncio.run(get_code_cells())
+        # then
+        self.assertEqual(json.loads(result), [{'cellId': 'c1'}])
+        session.get.assert_called_once_with('http://localhost:8801/rest/notebookctrl/getCodeCells',
+                                            params={'filter': 'c1'})
+
+    def test_should_reject_unknown_batch_method(self):
+        # given
+        beakerx = MagicMock()
+        # when
+        with self.assertRaises(ValueError):
+            BeakerX.batch(beakerx, [('showStatus', 'done'), ('setCodeCellBdy', 'cell1', '1 + 1')])
+        # then
+        beakerx.showStatus.assert_not_called()
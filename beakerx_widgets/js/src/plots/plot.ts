@@ -29,7 +29,112 @@ const OUTPUT_POINTS_PREVIEW_NUMBER = 10000;
 
 type PlotModelType = any;
 
+function deserializeBinaryColumn(column: any, buffers?: DataView[]): any[] {
+  const view: DataView = typeof column.value === 'number' ? buffers[column.value] : column.value;
+  const values = new Float64Array(view.buffer.slice(view.byteOffset, view.byteOffset + view.byteLength));
+  const result = new Array(values.length);
+
+  for (let i = 0; i < values.length; i++) {
+    const value = values[i];
+    if (isNaN(value)) {
+      result[i] = 'NaN';
+    } else if (column.kind === 'Date') {
+      result[i] = { type: 'Date', timestamp: value };
+    } else {
+      result[i] = value;
+    }
+  }
+
+  return result;
+}
+
+function deserializeBinaryGraphics(graphics: any, buffers?: DataView[]): any {
+  if (!_.isObject(graphics) || _.isArray(graphics)) {
+    return graphics;
+  }
+
+  for (const key of Object.keys(graphics)) {
+    const column = graphics[key];
+    if (column && column.type === 'Buffer' && (column.value instanceof DataView || typeof column.value === 'number')) {
+      graphics[key] = deserializeBinaryColumn(column, buffers);
+    }
+  }
+
+  return graphics;
+}
+
+function mergeChanges(target: any, changes: any): void {
+  for (const key of Object.keys(changes)) {
+    if (changes[key] === null) {
+      delete target[key];
+    } else {
+      target[key] = changes[key];
+    }
+  }
+}
+
+function appendTail(graphics: any, tail: any, window: number | null): void {
+  for (const key of Object.keys(tail)) {
+    let values = (graphics[key] || []).concat(tail[key]);
+    if (window != null && values.length > window) {
+      values = values.slice(values.length - window);
+    }
+    graphics[key] = values;
+  }
+}
+
+export function applyModelPatch(plotModel: PlotModelType, patch: any, buffers: DataView[]): void {
+  mergeChanges(plotModel, patch.model);
+
+  for (const graphics of plotModel.graphics_list) {
+    const changes = patch.items[graphics.uid];
+    if (changes) {
+      mergeChanges(graphics, deserializeBinaryGraphics(changes, buffers));
+    }
+
+    const tail = patch.appended && patch.appended[graphics.uid];
+    if (tail) {
+      appendTail(graphics, deserializeBinaryGraphics(tail, buffers), patch.window);
+    }
+  }
+
+  for (const graphics of patch.added) {
+    plotModel.graphics_list.push(deserializeBinaryGraphics(graphics, buffers));
+  }
+}
+
+export function deserializePlotModel(plotModel: PlotModelType): PlotModelType {
+  if (!plotModel) {
+    return plotModel;
+  }
+  if (_.isArray(plotModel.graphics_list)) {
+    plotModel.graphics_list = plotModel.graphics_list.map(deserializeBinaryGraphics);
+  }
+  if (_.isArray(plotModel.plots)) {
+    plotModel.plots = plotModel.plots.map(deserializePlotModel);
+  }
+
+  return plotModel;
+}
+
 export class PlotModel extends DOMWidgetModel {
+  static serializers = {
+    ...DOMWidgetModel.serializers,
+    model: { deserialize: deserializePlotModel },
+  };
+
+  initialize(attributes: any, options: any): void {
+    super.initialize(attributes, options);
+    this.on('msg:custom', this.handleCustomMessage, this);
+  }
+
+  handleCustomMessage(content: any, buffers: DataView[]): void {
+    if (content.event === 'modelPatch') {
+      applyModelPatch(this.get('model'), content.patch, buffers);
+      this.trigger('beakerx-modelPatched', content.keepFocus === true);
+    }
+  }
+
   defaults(): any {
     return {
       ...super.defaults(),
@@ -65,7 +170,8 @@ export class PlotView extends DOMWidgetView {
       }
 
       this.listenTo(this.model, 'change:updateData', this.handleUpdateData);
-      this.listenTo(this.model, 'change:model', this.handleModelUpdate);
+      this.listenTo(this.model, 'change:model', () => this.handleModelUpdate());
+      this.listenTo(this.model, 'beakerx-modelPatched', (keepFocus: boolean) => this.handleModelUpdate(keepFocus));
       this.listenTo(this.model, 'beakerx-tabSelected', () => {
         this._currentScope.adjustModelWidth();
       });
@@ -91,7 +197,7 @@ export class PlotView extends DOMWidgetView {
         return Math.max.apply(
           null,
           plotModel.graphics_list.map((graphic) => {
-            return graphic.length;
+            return graphic.type === 'HistogramBins' ? graphic.x.length : graphic.length;
           }),
         );
       default:
@@ -151,10 +257,56 @@ export class PlotView extends DOMWidgetView {
     plotModel.outputPointsPreviewNumber = OUTPUT_POINTS_PREVIEW_NUMBER;
   }
 
-  handleModelUpdate(): void {
+  handleModelUpdate(keepFocus = false): void {
     const newModel = this.model.get('model');
+    const focus = keepFocus ? this.getFocusValues() : null;
     this._currentScope.updateModelData && this._currentScope.updateModelData(newModel);
     this._currentScope.updatePlot();
+    if (focus) {
+      this.setFocusValues(focus);
+    }
+  }
+
+  // focus is kept as axis values because its percentages are relative to the data range, which a new slice changes
+  getFocusValues(): any {
+    const scope = this._currentScope;
+    if (!scope.plotFocus || !scope.stdmodel || !scope.stdmodel.xAxis) {
+      return null;
+    }
+    const focus = scope.plotFocus.getFocus();
+    const model = scope.stdmodel;
+    const values: any = {
+      xl: model.xAxis.getValue(focus.xl),
+      xr: model.xAxis.getValue(focus.xr),
+      yl: model.yAxis.getValue(focus.yl),
+      yr: model.yAxis.getValue(focus.yr),
+    };
+    if (model.yAxisR) {
+      values.yl_r = model.yAxisR.getValue(focus.yl_r);
+      values.yr_r = model.yAxisR.getValue(focus.yr_r);
+    }
+
+    return values;
+  }
+
+  setFocusValues(values: any): void {
+    const scope = this._currentScope;
+    const model = scope.stdmodel;
+    const focus: any = {
+      xl: model.xAxis.getPercent(values.xl),
+      xr: model.xAxis.getPercent(values.xr),
+      yl: model.yAxis.getPercent(values.yl),
+      yr: model.yAxis.getPercent(values.yr),
+    };
+    if (model.yAxisR && values.yl_r != null) {
+      focus.yl_r = model.yAxisR.getPercent(values.yl_r);
+      focus.yr_r = model.yAxisR.getPercent(values.yr_r);
+    }
+    const next = { ...scope.plotFocus.getFocus(), ...focus };
+    scope.plotFocus.fix(next);
+    scope.plotFocus.setFocus(next);
+    scope.plotRange.calcMapping();
+    scope.update();
   }
 
   handleUpdateData(): void {
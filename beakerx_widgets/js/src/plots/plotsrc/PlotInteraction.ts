@@ -18,7 +18,7 @@ import * as _ from 'underscore';
 import * as d3 from 'd3';
 import $ from 'jquery';
 import { PlotTip } from './PlotTip';
-import { PlotKeyboardUtils, PlotUtils } from '../../utils';
+import { PlotKeyboardUtils, PlotStyleUtils, PlotUtils } from '../../utils';
 import { disableZoomWheel, enableZoomWheel } from './zoom';
 
 export class PlotInteraction {
@@ -39,6 +39,7 @@ export class PlotInteraction {
     this.onMouseLeaveTooltip = this.onMouseLeaveTooltip.bind(this);
     this.onClickrespTooltip = this.onClickrespTooltip.bind(this);
     this.toggleVisibility = this.toggleVisibility.bind(this);
+    this.emitRangeQuery = _.debounce(this.emitRangeQuery.bind(this), 100);
   }
 
   bindEvents() {
@@ -93,6 +94,36 @@ export class PlotInteraction {
     }
   }
 
+  emitRangeQuery(reset = false) {
+    const model = this.scope.model.getCellModel();
+    const xAxis = this.scope.stdmodel.xAxis;
+    const focus = this.scope.plotFocus.getFocus();
+
+    if (model.server_lod == null || !xAxis || !focus) {
+      return;
+    }
+
+    const toValue = (percent) => {
+      const value = parseFloat(xAxis.getValue(percent).toString());
+
+      return xAxis.axisType === 'log' ? Math.pow(xAxis.axisBase, value) : value;
+    };
+
+    this.scope.plotDisplayModel.send(
+      {
+        event: 'onzoom',
+        plotId: this.scope.stdmodel.plotId,
+        itemId: null,
+        params: {
+          xl: reset ? null : toValue(focus.xl),
+          xr: reset ? null : toValue(focus.xr),
+          width: Math.round(PlotStyleUtils.safeWidth(this.scope.jqsvg) - this.scope.layout.leftLayoutMargin),
+        },
+      },
+      this.scope.plotDisplayView.callbacks(),
+    );
+  }
+
   prepare() {
     const model = this.scope.stdmodel;
 
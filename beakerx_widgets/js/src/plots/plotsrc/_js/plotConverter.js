@@ -510,13 +510,15 @@ define(['underscore', 'big.js', 'd3'], function (_, Big, d3) {
           }
           break;
         case 'Histogram':
-          if (!list || !list.length || !list[0] || !list[0].length) {
+          if (!list || !list.length || !list[0] || !(list[0].length || list[0].type === 'HistogramBins')) {
             break;
           }
           var datasets = [];
+          // bins computed by the kernel already have normed, cumulative and display mode applied
+          var binned = list[0].type === 'HistogramBins';
           var rangeMin = list[0][0],
             rangeMax = rangeMin;
-          for (var i = 0; i < list.length; i++) {
+          for (var i = 0; i < list.length && !binned; i++) {
             rangeMin = Math.min(rangeMin, d3.min(list[i]));
             rangeMax = Math.max(rangeMax, d3.max(list[i]));
           }
@@ -541,24 +543,28 @@ define(['underscore', 'big.js', 'd3'], function (_, Big, d3) {
               }
             }
 
-            var histvalues = PlotUtils.histogram(
-              newmodel.rightClose,
-              newmodel.binCount,
-              newmodel.rangeMin != null ? newmodel.rangeMin : rangeMin,
-              newmodel.rangeMax != null ? newmodel.rangeMax : rangeMax,
-              dataset,
-            );
+            var histvalues = binned
+              ? dataset.x.map(function (x, j) {
+                  return { x: x, y: dataset.y[j], dx: dataset.width };
+                })
+              : PlotUtils.histogram(
+                  newmodel.rightClose,
+                  newmodel.binCount,
+                  newmodel.rangeMin != null ? newmodel.rangeMin : rangeMin,
+                  newmodel.rangeMax != null ? newmodel.rangeMax : rangeMax,
+                  dataset,
+                );
 
             datasets.push(histvalues);
 
             var sumy = 0;
-            if (newmodel.normed === true) {
+            if (newmodel.normed === true && !binned) {
               for (var j = 0; j < histvalues.length; j++) {
                 sumy += histvalues[j].y;
               }
             }
 
-            for (var j = 0; j < histvalues.length; j++) {
+            for (var j = 0; j < histvalues.length && !binned; j++) {
               if (newmodel.normed === true) {
                 histvalues[j].y = histvalues[j].y / sumy;
               }
@@ -575,7 +581,9 @@ define(['underscore', 'big.js', 'd3'], function (_, Big, d3) {
                 histvalues[j].dx = histvalues[j].dx / list.length;
                 histvalues[j].x += histvalues[j].dx * i;
               }
+            }
 
+            for (var j = 0; j < histvalues.length; j++) {
               var histvalue = histvalues[j];
               item.x.push(histvalue.x);
               item.y.push(histvalue.y);
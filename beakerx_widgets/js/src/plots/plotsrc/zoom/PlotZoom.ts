@@ -31,6 +31,7 @@ export class PlotZoom {
   eventDispatcher: EventDispatcher;
 
   zoomObj: any = null;
+  rangeChanged = false;
 
   constructor(scope) {
     this.scope = scope;
@@ -49,7 +50,10 @@ export class PlotZoom {
   init(): void {
     this.zoomObj.on('start', this.zoomStart).on('zoom', this.zooming).on('end', this.zoomEnd);
 
-    this.scope.svg.on('dblclick', () => this.scope.plotFocus.reset());
+    this.scope.svg.on('dblclick', () => {
+      this.scope.plotFocus.reset();
+      this.scope.plotInteraction.emitRangeQuery(true);
+    });
 
     const svgElement = this.scope.svg.node();
 
@@ -112,6 +116,11 @@ export class PlotZoom {
     if (this.scope.interactMode !== 'locate') {
       this.scope.jqsvg.css('cursor', 'auto');
 
+      if (this.rangeChanged) {
+        this.rangeChanged = false;
+        this.scope.plotInteraction.emitRangeQuery();
+      }
+
       return;
     }
 
@@ -133,6 +142,7 @@ export class PlotZoom {
       this.boxZoom.resetLocateBox();
       this.scope.update();
       this.scope.interactMode = 'zoom';
+      this.scope.plotInteraction.emitRangeQuery();
     } else {
       this.boxZoom.resetLocateBox();
     }
@@ -192,6 +202,7 @@ export class PlotZoom {
       this.scaleGraph(mx, my, zoomRate, d3trans);
     }
 
+    this.rangeChanged = true;
     this.scope.plotRange.calcMapping(true);
     this.scope.plotCursor.render({ offsetX: mx, offsetY: my });
     this.scope.plotFocus.fix(this.scope.plotFocus.getFocus());
@@ -82,6 +82,9 @@ setup_args = dict(
         "pyspark",
         "jupyter-server",
     ],
+    extras_require={
+        "arrow": ["pyarrow"],
+    },
     zip_safe=False,
     include_package_data=True,
     python_requires=">=3",